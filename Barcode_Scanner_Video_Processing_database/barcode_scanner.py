@@ -1,12 +1,14 @@
 # Barcode and QR code scanning module
 import cv2
 import numpy as np
+import os
+import sys
 from pyzbar.pyzbar import decode, ZBarSymbol
 
-# The following code reads a QR code from a video stream
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+from frame_reader import read_frames
 
-# Initialize running as True
-running = True
+# The following code reads a QR code from a video stream
 
 # Run while true
 while True:
@@ -30,15 +32,8 @@ if camSource == 1:
 else:
     cap = cv2.VideoCapture(0)
 
-# Loop while running is True
-while running:
-    
-    # Read the video stream
-    success, img = cap.read()
-    #print(success)
-
-    if not success:
-        break
+# Loop over the video stream until it ends
+for frame_idx, timestamp_ms, img in read_frames(cap):
   
     for code in decode(img):
         #print(code)
@@ -1,54 +1,36 @@
 import cv2
-import numpy as np
-from pyzbar.pyzbar import decode, ZBarSymbol
 import os
+import sys
 import time
 from database_website import search_product, add_product, update_quantity, initialize_database  # Import database functions
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+from scan_engine import ScanEngine
+from scan_metrics import metrics
+
 initialize_database()  # Automatically initialize the database when script runs
 
 # Time threshold to prevent duplicate scans (in seconds)
 SCAN_RESET_TIME = 5  
 recently_scanned = {}  # Store recently scanned barcodes with timestamps
 
-# Barcode/QR code detection function for image frames 
-def process_frame(frame):
-    detected = False
-    
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)  # ✅ Convert to grayscale (Scientific Computing: image preprocessing)
-    
-    blurred_frame = cv2.GaussianBlur(gray_frame, (5, 5), 0)  # ✅ Gaussian Blur for noise reduction (Scientific Computing: filtering, convolution)
-
-    processed_barcodes = set()
-    detected_barcodes = []
-
-    decoded_objects = decode(
-        blurred_frame,
-        symbols=[ZBarSymbol.QRCODE, ZBarSymbol.EAN13, ZBarSymbol.UPCA, ZBarSymbol.CODE128]
-    )  # ✅ Barcode decoding using optimized library (Scientific Computing: signal decoding)
-
-    for obj in decoded_objects:
-        decoded_text = obj.data.decode('utf-8')
-
-        if decoded_text not in processed_barcodes:
-            detected = True
-            processed_barcodes.add(decoded_text)
-            detected_barcodes.append(decoded_text)
+# Engine for single frames passed to process_frame without one
+scan_engine = ScanEngine()
 
-            # ✅ NumPy for geometric shape construction (Scientific Computing: matrix operations)
-            points = obj.polygon
-            if len(points) == 4:
-                pts = np.array(points, dtype=np.int32).reshape((-1, 1, 2))
-                cv2.polylines(frame, [pts], isClosed=True, color=(0, 255, 0), thickness=2)
-
-            x, y, w, h = obj.rect
-            cv2.putText(frame, f"{obj.type}: {decoded_text}", (x, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-    return frame, detected, detected_barcodes
+# Barcode/QR code detection function for image frames 
+# decoded_objects can be passed in when the decode already ran in a worker process
+def process_frame(frame, decoded_objects=None, engine=None):
+    # ✅ Grayscale + Gaussian blur + barcode decoding (Scientific Computing: filtering, signal decoding),
+    # then NumPy polygons for the overlay (Scientific Computing: matrix operations)
+    frame, detections = (engine or scan_engine).process_frame(frame, decoded_objects)
+    return frame, bool(detections), [detection.data for detection in detections]
 
 # Function to process uploaded video files
-def process_video(file_path):
+# workers > 1 decodes frames on that many processes, None picks one per spare core
+# motion_gate: MotionGate with custom thresholds, True for the defaults, False to decode every frame
+# quality_gate: QualityGate that skips motion-blurred frames, True for the defaults, False to decode every frame
+# stride > 1 only looks at every stride-th frame; skipped frames are grabbed but never converted
+def process_video(file_path, workers=1, motion_gate=True, stride=1, quality_gate=False):
     cap = cv2.VideoCapture(file_path)
     if not cap.isOpened():
         print("Error: Could not open video file.")
@@ -57,20 +39,19 @@ def process_video(file_path):
     output_folder = os.path.join(os.getcwd(), "detected_frames")
     os.makedirs(output_folder, exist_ok=True)  # ✅ File system management (Scientific Computing: file I/O automation)
 
-    frame_idx = 0
     barcode_detected_count = 0
     detected_barcodes_across_frames = set()
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    # ✅ Sampling with grab()/retrieve() (Scientific Computing: avoid wasted computation)
+    # ✅ Adaptive frame skipping via frame differencing (Scientific Computing: signal change detection)
+    # ✅ Sharpness scoring via Laplacian variance with an adaptive threshold (Scientific Computing: signal quality estimation)
+    # ✅ Lazy evaluation: overlays are drawn only on the frames that get saved (Scientific Computing: avoid wasted computation)
+    engine = ScanEngine(stride=stride, motion_gate=motion_gate, quality_gate=quality_gate, overlay=False,
+                        workers=workers)
 
-        if frame_idx % 2 != 0:
-            frame_idx += 1
-            continue  # ✅ Frame skipping for performance (Scientific Computing: optimization)
-
-        processed_frame, detected, detected_barcodes = process_frame(frame)
+    for frame_idx, timestamp_ms, processed_frame, detections in engine.scan(engine.read(cap)):  # ✅ Parallel decoding across processes (Scientific Computing: parallelism)
+        detected_barcodes = [detection.data for detection in detections]
+        drawn = False
 
         for barcode_text in detected_barcodes:
             if barcode_text not in detected_barcodes_across_frames:
@@ -99,12 +80,18 @@ def process_video(file_path):
                 # ✅ Save computed output to disk (Scientific Computing: reproducibility and logging)
                 barcode_detected_count += 1
                 frame_filename = os.path.join(output_folder, f"detected_{frame_idx:04d}.png")
-                cv2.imwrite(frame_filename, processed_frame)
+                if not drawn:
+                    engine.draw(processed_frame, detections)
+                    drawn = True
+                with metrics.time("encode"):
+                    _, encoded = cv2.imencode(".png", processed_frame)
+                with metrics.time("file_write"), open(frame_filename, "wb") as file:
+                    file.write(encoded.tobytes())
                 print(f"Saved barcode-detected frame: {frame_filename}")
 
-        frame_idx += 1
-
     cap.release()
     print(f"Video processing complete. {barcode_detected_count} unique barcodes detected.")  # ✅ Aggregate metric tracking (Scientific Computing: performance monitoring)
+    print(engine.summary())
+    print(metrics.summary())  # ✅ Per-stage timing histograms (Scientific Computing: profiling)
     return list(detected_barcodes_across_frames)
 
@@ -1,40 +1,20 @@
 # Barcode/QR code detection in video feed or file using OpenCV and pyzbar
 import cv2
-import numpy as np
-from pyzbar.pyzbar import decode, ZBarSymbol
 import os
+import sys
 
-# Define barcode/QR code detection function
-def process_frame(frame):
-    detected = False
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    blurred_frame = cv2.GaussianBlur(gray_frame, (5, 5), 0)
-    global decoded_text
-    # Detect barcodes and QR codes
-    decoded_objects = decode(
-        blurred_frame, 
-        symbols=[ZBarSymbol.QRCODE, ZBarSymbol.EAN13, ZBarSymbol.UPCA, ZBarSymbol.CODE128]
-    )
-
-    for obj in decoded_objects:
-        detected = True  # Barcode detected
-        
-        # Draw bounding box around detected barcode
-        points = obj.polygon
-        if len(points) == 4:
-            pts = np.array(points, dtype=np.int32)
-            pts = pts.reshape((-1, 1, 2))
-            cv2.polylines(frame, [pts], isClosed=True, color=(0, 255, 0), thickness=2)
-
-        # Draw decoded text above the barcode
-        decoded_text = obj.data.decode('utf-8')
-        x, y, w, h = obj.rect
-        cv2.putText(frame, f"{obj.type}: {decoded_text}", (x, y - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-        print(f"Decoded {obj.type}: {decoded_text}")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+from scan_engine import ScanEngine
 
+engine = ScanEngine()
 
-    return frame, detected
+# Define barcode/QR code detection function
+# Returns the annotated frame and the decoded texts found in it
+def process_frame(frame):
+    frame, detections = engine.process_frame(frame)  # Detect, then draw boxes and labels
+    for detection in detections:
+        print(f"Decoded {detection.type}: {detection.data}")
+    return frame, [detection.data for detection in detections]
 
 # Ask user to select source
 choice = input("Enter '0' for camera feed or '1' for video file: ")
@@ -58,22 +38,18 @@ if not os.path.exists(output_folder):
 if not cap.isOpened():
     print("Error: Could not open the camera or video file.")
 else:
-    frame_idx = 0  # Frame index for saving
     barcode_detected_count = 0
 
     detected_barcodes = []  # List to store detected barcode data
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break  # End of video or camera feed interrupted
-
+    for frame_idx, timestamp_ms, frame in engine.read(cap):  # Ends with the video or when the camera feed is interrupted
         # Process frame for barcode detection
-        processed_frame, detected = process_frame(frame)
+        processed_frame, decoded_texts = process_frame(frame)
 
-        # Save frames with detected barcodes
-        if detected and decoded_text not in detected_barcodes:
-            detected_barcodes.append(decoded_text)
+        # Save frames with newly detected barcodes
+        new_barcodes = [text for text in decoded_texts if text not in detected_barcodes]
+        if new_barcodes:
+            detected_barcodes.extend(new_barcodes)
             barcode_detected_count += 1
             frame_filename = os.path.join(output_folder, f"detected_{frame_idx:04d}.png")
             cv2.imwrite(frame_filename, processed_frame)
@@ -85,9 +61,7 @@ else:
             if cv2.waitKey(1) & 0xFF == ord('q'):
                 break
 
-        frame_idx += 1
-
     # Release resources
     cap.release()
     cv2.destroyAllWindows()
-    print(f"Processing completed. Total barcode-detected frames: {barcode_detected_count, decoded_text}")
\ No newline at end of file
+    print(f"Processing completed. Total barcode-detected frames: {barcode_detected_count}, barcodes: {detected_barcodes}")
\ No newline at end of file
@@ -1,46 +1,114 @@
-import cv2
+# Extract every stride-th frame of a video as grayscale images
+#
+# The sampled frames are split into `workers` contiguous segments and each
+# segment is extracted by its own process, which opens the video itself and
+# seeks to the segment start with CAP_PROP_POS_FRAMES. Frames are named after
+# their index in the whole video (frame_000120.png), so the output is the
+# same whatever the worker count. Segment starts are multiples of the stride
+# and every segment ends where the next one starts, so each sampled frame is
+# written by exactly one segment; when a seek doesn't land exactly on the
+# requested frame (some codecs only seek to keyframes), that segment grabs
+# forward from the start of the video instead of guessing.
+#
+#   python video_processing.py video.mov
+#   python video_processing.py video.mov --output extracted_frames --stride 5 --format jpg --workers 4
+
+import argparse
 import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+from frame_reader import read_frames
+from frame_writer import DEFAULT_QUALITY, FORMATS
+
+
+# [start, end) frame ranges that split the sampled frames 0, stride, 2*stride, ... < n_frames
+# into `segments` runs of (nearly) equal length; the last one is open-ended (end None) because
+# CAP_PROP_FRAME_COUNT is only an estimate for some containers
+def segment_ranges(n_frames, stride, segments):
+    samples = max(1, -(-n_frames // stride))  # ceil
+    segments = max(1, min(segments, samples))
+    bounds = [round(i * samples / segments) * stride for i in range(segments + 1)]
+    return [(bounds[i], bounds[i + 1] if i < segments - 1 else None) for i in range(segments)]
+
 
-# Path to video file
-video_file = r"C:\barcode-scanner-app\file_example_MOV_1920_2_2MB.mov"
-output_folder = r"C:\barcode-scanner-app\extracted_frames"
+# Capture positioned so the next grab() returns frame `start`
+def open_at(video_file, start):
+    cap = cv2.VideoCapture(video_file)
+    if start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        if int(round(cap.get(cv2.CAP_PROP_POS_FRAMES))) != start:  # Inexact seek: count frames from the start
+            cap.release()
+            cap = cv2.VideoCapture(video_file)
+            for _ in range(start):
+                if not cap.grab():
+                    break
+    return cap
 
-# Create output folder if it doesn't exist
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
 
-# Open video file
-cap = cv2.VideoCapture(video_file)
+def frame_path(output_folder, frame_idx, image_format):
+    return os.path.join(output_folder, f"frame_{frame_idx:06d}{FORMATS[image_format][0]}")
 
-# Check if the video file was successfully opened
-if not cap.isOpened():
-    print(f"Error: Could not open video file at {video_file}")
-else:
-    # Get total number of frames
+
+# Runs in a worker process: write the sampled frames of [start, end) and return their indices
+def extract_segment(video_file, output_folder, start, end, stride, image_format):
+    quality_flag = FORMATS[image_format][1]
+    params = [quality_flag, DEFAULT_QUALITY[image_format]]
+    cap = open_at(video_file, start)
+    written = []
+    # The capture is already at `start`; grab through gaps instead of seeking so indices stay exact
+    for offset, _, frame in read_frames(cap, stride, end=None if end is None else end - start,
+                                        seek_threshold=float("inf")):
+        frame_idx = start + offset
+        grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        cv2.imwrite(frame_path(output_folder, frame_idx, image_format), grey, params)
+        written.append(frame_idx)
+    cap.release()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract every stride-th frame of a video as grayscale images")
+    parser.add_argument("video_file", help="video to extract frames from")
+    parser.add_argument("--output", default="extracted_frames", help="output folder (created if missing)")
+    parser.add_argument("--stride", type=int, default=10, help="save every stride-th frame")
+    parser.add_argument("--format", default="png", choices=sorted(FORMATS), help="image format")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="segments extracted in parallel")
+    args = parser.parse_args()
+
+    stride = max(1, args.stride)
+    os.makedirs(args.output, exist_ok=True)
+
+    # Open video file
+    cap = cv2.VideoCapture(args.video_file)
+    if not cap.isOpened():
+        sys.exit(f"Error: Could not open video file at {args.video_file}")
     n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
     print(f"Total frames in the video: {n_frames}")
 
-    frame_idx = 0  # Start index for saving frames
-    count = 0
+    # Cameras / streams report no frame count and can't be seeked: one segment
+    segments = segment_ranges(n_frames, stride, args.workers) if n_frames > 0 else [(0, None)]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(segments)) as pool:
+        jobs = [pool.submit(extract_segment, args.video_file, args.output, start, end, stride, args.format)
+                for start, end in segments]
+        results = [job.result() for job in jobs]
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        
-        if not ret:
-            break  # If no frame is returned, stop processing
-        count += 1
-        #if count % 10 != 0:
-            #continue
+    # Segments must join up exactly: together they wrote 0, stride, 2*stride, ... with nothing missing or repeated
+    written = [frame_idx for result in results for frame_idx in result]
+    expected = list(range(0, len(written) * stride, stride))
+    if written != expected:
+        mismatch = next(i for i, (got, want) in enumerate(zip(written + [None], expected + [None])) if got != want)
+        print(f"Warning: extracted frames don't line up at frame {expected[min(mismatch, len(expected) - 1)]}")
 
-        # Save every frame as an image file (every 10 frames)
-        frame_filename = os.path.join(output_folder, f"frame_{frame_idx:04d}.png") 
-        if frame_idx % 10 == 0:
-            grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            cv2.imwrite(frame_filename, grey)
-        ##print(f"Saved: {frame_filename}")
+    print(f"Video processing completed: {len(written)} frames from {len(segments)} segments "
+          f"in {time.perf_counter() - started:.1f} s")
 
-        frame_idx += 1
 
-    # Release video capture when done
-    cap.release()
-    print("Video processing completed.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# Non-interactive batch scanning of whole folders of videos and images
+#
+# Scans every video and image matched by the given folders / glob patterns on
+# a pool of worker processes, one file per worker at a time, with one row
+# per detection:
+#
+#     file, frame, timestamp_ms, symbology, data, bbox (left, top, width, height)
+#
+# as JSON lines or CSV. Within a file, a barcode is reported again only after
+# --dedup-seconds of video time (0 reports it on every frame it was decoded in).
+#
+# Workers write each row to a part file of their own (JSON lines in a
+# temporary folder) as soon as it is found, so a long video's rows are never
+# held in memory. By default a file's rows reach the output only when the
+# whole file is finished: its part is then appended in one block, so the
+# output only ever holds whole files, each in one piece, which is what makes
+# resuming (below) possible. With --rows-as-found the parts are followed
+# while the workers write them and every row is written out within a fraction
+# of a second of being found, rows of different files interleaved; there is
+# no progress file then, a re-run starts over, and a file that fails part
+# way keeps the rows written before it failed.
+#
+# Progress is kept in <output>.progress: one JSON line per finished file with
+# its size, modification time and where its block starts and ends in the
+# output. Re-running the same command skips the files listed there and cuts
+# off anything after the last recorded block (a block interrupted mid-write).
+# Files that changed since they were scanned are scanned again, and their old
+# block is removed from the output first, so they are never reported twice.
+# --restart ignores the progress file and starts over.
+#
+# Nothing is written to the inventory database; this only extracts codes.
+#
+#   python batch_scan.py test_images_videos/ -o results.jsonl
+#   python batch_scan.py "/mnt/cctv/2024-*/**/*.mp4" -o nightly.csv --workers 8 --stride 5 --roi-tracking
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import cv2
+
+from decoder_backends import DEFAULT_BACKEND, get_backend
+from parallel_decode import SCAN_SYMBOLS, default_workers
+from scan_dedup import ScanDeduplicator
+from scan_engine import ScanEngine
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".m4v", ".wmv", ".webm", ".mpg", ".mpeg", ".ts", ".y4m"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp"}
+FIELDS = ["file", "frame", "timestamp_ms", "symbology", "data", "bbox"]
+
+
+# Video and image files for a list of files, folders (searched recursively) and glob patterns, sorted
+def find_media(inputs):
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(glob.escape(pattern), "**", "*"), recursive=True)
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        paths.update(path for path in matches if os.path.isfile(path)
+                     and os.path.splitext(path)[1].lower() in VIDEO_EXTENSIONS | IMAGE_EXTENSIONS)
+    return sorted(paths)
+
+
+# Identifies a file's contents for the progress file without reading it
+def file_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+# (frame_idx, timestamp_ms, frame) tuples of a video or a single image
+def media_frames(path, engine):
+    if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+        frame = cv2.imread(path)
+        if frame is None:
+            raise ValueError(f"could not read image {path}")
+        yield 0, 0.0, frame
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"could not open video {path}")
+    try:
+        yield from engine.read(cap)
+    finally:
+        cap.release()
+
+
+# Runs in a worker process: scan one file, write its rows to part_path as JSON lines as they are
+# found and return the row and frame counts
+# options: keyword arguments for ScanEngine plus dedup_seconds
+def scan_file(path, options, part_path):
+    options = dict(options)
+    dedup = ScanDeduplicator(options.pop("dedup_seconds"))
+    engine = ScanEngine(overlay=False, workers=1, **options)  # Parallelism is across files, not frames
+
+    row_count = 0
+    with open(part_path, "w") as part:
+        for frame_idx, timestamp_ms, _, detections in engine.scan(media_frames(path, engine)):
+            for detection in detections:
+                if dedup.is_duplicate(detection.data, timestamp_ms / 1000):
+                    continue
+                part.write(json.dumps({"file": path, "frame": frame_idx, "timestamp_ms": round(timestamp_ms, 1),
+                                       "symbology": detection.type, "data": detection.data,
+                                       "bbox": list(detection.rect)}) + "\n")
+                part.flush()  # Visible to the main process right away (--rows-as-found)
+                row_count += 1
+    return row_count, engine.frames_processed
+
+
+# Follows a part file written by scan_file: each read() yields the rows added since the last one
+class PartReader:
+
+    def __init__(self, path):
+        self.path = path
+        self.position = 0
+
+    def read(self):
+        if not os.path.exists(self.path):  # The worker hasn't started on this file yet
+            return
+        with open(self.path) as part:
+            part.seek(self.position)
+            while True:
+                line = part.readline()
+                if not line.endswith("\n"):  # End of file, or a row the worker is still writing
+                    return
+                self.position = part.tell()
+                yield json.loads(line)
+
+
+# Writes rows as JSON lines or CSV and flushes after every file (every call to write)
+class RowWriter:
+
+    def __init__(self, file, output_format, write_header):
+        self.file = file
+        self.output_format = output_format
+        if output_format == "csv":
+            self.csv = csv.DictWriter(file, fieldnames=FIELDS)
+            if write_header:
+                self.csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.output_format == "csv":
+                self.csv.writerow({**row, "bbox": " ".join(str(value) for value in row["bbox"])})
+            else:
+                self.file.write(json.dumps(row) + "\n")
+        self.file.flush()
+
+
+# Finished files from a progress file: path -> its progress record
+def load_progress(progress_path):
+    done = {}
+    if not os.path.exists(progress_path):
+        return done
+    with open(progress_path) as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn line from an interrupted run
+            done[record["file"]] = record
+    return done
+
+
+# Rewrite the output without the blocks of the files in `stale` and anything after the last
+# recorded block; `done` maps files to their progress records
+# Returns the progress records of the kept files with their new start and end offsets
+def compact_output(output_path, done, stale):
+    records = sorted(done.values(), key=lambda record: record["start"])
+    kept = {}
+    temp_path = output_path + ".tmp"
+    with open(output_path, "rb") as source, open(temp_path, "wb") as target:
+        target.write(source.read(records[0]["start"]))  # CSV header (nothing for JSON lines)
+        for record in records:
+            if record["file"] in stale:
+                continue
+            source.seek(record["start"])
+            start = target.tell()
+            target.write(source.read(record["offset"] - record["start"]))
+            kept[record["file"]] = {**record, "start": start, "offset": target.tell()}
+    os.replace(temp_path, output_path)
+    return kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan folders of videos and images for barcodes and QR codes")
+    parser.add_argument("inputs", nargs="+", help="files, folders or glob patterns (quote them, ** is recursive)")
+    parser.add_argument("-o", "--output", default="-", help="output file (.jsonl or .csv), - for stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="output format (default: from the output extension)")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="files scanned at the same time")
+    parser.add_argument("--stride", type=int, default=1, help="scan every stride-th video frame")
+    parser.add_argument("--roi-tracking", action="store_true", help="decode around the last detection between full scans")
+    parser.add_argument("--cascade", action="store_true", help="try a downscaled frame first")
+    parser.add_argument("--backend", default=DEFAULT_BACKEND,
+                        help="decoder backend, e.g. zbar, opencv or zbar,opencv (default: the calibrated one)")
+    parser.add_argument("--quality-gate", action="store_true", help="skip motion-blurred / low-contrast frames")
+    parser.add_argument("--tiles", action="store_true",
+                        help="decode overlapping tiles on a thread pool (for few, high-resolution files)")
+    parser.add_argument("--dedup-seconds", type=float, default=5.0,
+                        help="report a code again only after this much video time (0: every frame)")
+    parser.add_argument("--progress", help="progress file (default: <output>.progress; none for stdout)")
+    parser.add_argument("--restart", action="store_true", help="ignore earlier progress and overwrite the output")
+    parser.add_argument("--rows-as-found", action="store_true",
+                        help="write rows as soon as they are found, files interleaved (no progress file, no resume)")
+    args = parser.parse_args()
+
+    output_format = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    to_stdout = args.output == "-"
+    progress_path = args.progress or (None if to_stdout or args.rows_as_found else args.output + ".progress")
+    if args.rows_as_found and args.progress:
+        parser.error("--rows-as-found can't be resumed, so it keeps no --progress file")
+    if args.cascade and args.tiles:
+        parser.error("--cascade and --tiles can't be combined")
+    try:
+        get_backend(args.backend, SCAN_SYMBOLS)
+    except ValueError as error:
+        parser.error(str(error))
+    options = {"stride": args.stride, "quality_gate": args.quality_gate, "roi_tracking": args.roi_tracking,
+               "cascade": args.cascade,
+               "tiles": args.tiles, "backend": args.backend, "dedup_seconds": args.dedup_seconds}
+
+    done = {} if args.restart or progress_path is None else load_progress(progress_path)
+    paths = find_media(args.inputs)
+    todo = [path for path in paths
+            if path not in done or {key: done[path].get(key) for key in ("size", "mtime")} != file_signature(path)]
+    print(f"{len(paths)} files found, {len(paths) - len(todo)} already scanned, {len(todo)} to scan", file=sys.stderr)
+
+    if to_stdout:
+        output = sys.stdout
+        write_header = True
+    else:
+        if done and os.path.exists(args.output):  # Drop the blocks of changed files and of an interrupted write
+            done = compact_output(args.output, done, set(todo))
+        else:
+            done = {}
+        output = open(args.output, "a" if done else "w", newline="")
+        write_header = output.tell() == 0
+    writer = RowWriter(output, output_format, write_header)
+    progress = None
+    if progress_path is not None:  # Rewritten from the kept records: their offsets may have moved
+        progress = open(progress_path, "w")
+        for record in done.values():
+            progress.write(json.dumps(record) + "\n")
+        progress.flush()
+
+    started = time.perf_counter()
+    frames = rows_written = failed = 0
+    try:
+        with tempfile.TemporaryDirectory(prefix="batch_scan-") as part_folder, \
+                ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            parts = {path: PartReader(os.path.join(part_folder, f"{index}.jsonl")) for index, path in enumerate(todo)}
+            futures = {pool.submit(scan_file, path, options, parts[path].path): path for path in todo}
+            running = set(futures)
+            count = 0
+            try:
+                while running:
+                    finished, running = wait(running, timeout=0.2 if args.rows_as_found else None,
+                                             return_when=FIRST_COMPLETED)
+                    if args.rows_as_found:
+                        for future in running:
+                            writer.write(parts[futures[future]].read())
+
+                    for future in finished:
+                        count += 1
+                        path = futures[future]
+                        try:
+                            row_count, frame_count = future.result()
+                        except Exception as error:  # Unreadable or corrupt file: report it and leave it for the next run
+                            failed += 1
+                            print(f"[{count}/{len(todo)}] {path}: failed ({error})", file=sys.stderr)
+                            continue
+
+                        start = output.tell() if not to_stdout else 0
+                        writer.write(parts[path].read())  # The whole part, or what --rows-as-found hasn't written yet
+                        os.remove(parts[path].path)
+                        frames += frame_count
+                        rows_written += row_count
+                        if progress is not None:
+                            offset = output.tell() if not to_stdout else 0
+                            progress.write(json.dumps({"file": path, **file_signature(path), "start": start,
+                                                       "offset": offset, "rows": row_count}) + "\n")
+                            progress.flush()
+                        print(f"[{count}/{len(todo)}] {path}: {frame_count} frames, {row_count} codes",
+                              file=sys.stderr)
+            finally:
+                for future in futures:  # Interrupted: don't start the files nobody will record
+                    future.cancel()
+    finally:
+        if progress is not None:
+            progress.close()
+        if not to_stdout:
+            output.close()
+
+    seconds = time.perf_counter() - started
+    print(f"Scanned {len(todo) - failed} files ({frames} frames) in {seconds:.1f} s: {rows_written} rows, "
+          f"{failed} failed", file=sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
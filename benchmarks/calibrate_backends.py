@@ -0,0 +1,147 @@
+# Pick the fastest decoder backend that still finds enough codes
+#
+# Decodes a sample of frames from every video in a folder with each candidate
+# backend (see decoder_backends.py) and saves the fastest one whose recall
+# meets --target-recall to decoder_calibration.json, which every scanner then
+# uses by default (the SCAN_BACKEND environment variable still wins). Scanners
+# read it when they start, so restart a running Flask app to pick it up. The
+# file is machine-specific and ignored by git.
+#
+# Frames are read, converted and blurred once up front, so only the decode
+# itself is timed. Recall is measured against manifest.json when the folder
+# is a synthetic corpus (see synthetic_corpus.py); for real footage, where
+# nobody knows what is in the videos, it is measured against everything any
+# candidate found. Without a folder a small synthetic corpus is generated.
+#
+# Run from the repository root:
+#   python -m benchmarks.calibrate_backends footage/ --target-recall 0.95
+#   python -m benchmarks.calibrate_backends --candidates zbar opencv "zbar,opencv" --dry-run
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+
+from batch_scan import find_media
+from benchmarks.scanner_benchmark import normalize_code
+from benchmarks.synthetic_corpus import MANIFEST, generate_corpus, load_corpus
+from decoder_backends import CALIBRATION_PATH, get_backend
+from frame_reader import read_frames
+from parallel_decode import SCAN_SYMBOLS
+
+DEFAULT_CANDIDATES = ("zbar", "opencv", "opencv_qr", "opencv_barcode", "zbar,opencv", "opencv,zbar")
+
+
+# Grayscale, blurred sample frames of one video (the images the scanners hand to the decoder)
+def sample_frames(path, stride, max_frames):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    for _, _, frame in read_frames(cap, stride):
+        frames.append(cv2.GaussianBlur(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (5, 5), 0))
+        if len(frames) >= max_frames:
+            break
+    cap.release()
+    return frames
+
+
+# Decode every sample with one backend: (seconds spent decoding, codes found per video)
+def run_candidate(backend, samples):
+    seconds = 0.0
+    found = []
+    for frames in samples:
+        codes = set()
+        for frame in frames:
+            started = time.perf_counter()
+            decoded_objects = backend(frame)
+            seconds += time.perf_counter() - started
+            codes.update(normalize_code(obj.data.decode("utf-8")) for obj in decoded_objects)
+        found.append(codes)
+    return seconds, found
+
+
+def recall(found, expected):
+    total = sum(len(codes) for codes in expected)
+    hits = sum(len(codes & truth) for codes, truth in zip(found, expected))
+    return hits / total if total else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Save the fastest decoder backend that meets a target recall")
+    parser.add_argument("footage", nargs="?", help="folder or glob of sample videos (default: a synthetic corpus)")
+    parser.add_argument("--candidates", nargs="+", default=list(DEFAULT_CANDIDATES), help="backend specs to try")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    parser.add_argument("--stride", type=int, default=5, help="sample every stride-th frame")
+    parser.add_argument("--frames", type=int, default=30, help="sample frames per video")
+    parser.add_argument("--output", default=CALIBRATION_PATH, help="calibration file to write")
+    parser.add_argument("--dry-run", action="store_true", help="only print the results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        footage = args.footage
+        if footage is None:
+            footage = os.path.join(work_folder, "corpus")
+            generate_corpus(footage, frame_count=args.frames * args.stride)
+
+        manifest = None
+        if os.path.isdir(footage) and os.path.exists(os.path.join(footage, MANIFEST)):
+            manifest = load_corpus(footage)
+            paths = [os.path.join(footage, video["video"]) for video in manifest]
+        else:
+            paths = [path for path in find_media([footage]) if not path.lower().endswith((".png", ".jpg", ".jpeg"))]
+        if not paths:
+            sys.exit(f"No videos found in {footage}")
+
+        print(f"Sampling up to {args.frames} frames from each of {len(paths)} videos...")
+        samples = [sample_frames(path, args.stride, args.frames) for path in paths]
+
+    frame_count = sum(len(frames) for frames in samples)
+    results = {}
+    for spec in args.candidates:
+        try:
+            backend = get_backend(spec, SCAN_SYMBOLS)
+        except (ValueError, AttributeError) as error:
+            print(f"{spec}: not available ({error})")
+            continue
+        seconds, found = run_candidate(backend, samples)
+        results[spec] = {"fps": frame_count / seconds if seconds else 0.0, "found": found}
+
+    if manifest is not None:
+        expected = [{normalize_code(code) for code in video["codes"]} for video in manifest]
+        reference = "manifest"
+    else:  # Real footage: what any backend found is the best available ground truth
+        expected = [set().union(*(result["found"][i] for result in results.values())) for i in range(len(paths))]
+        reference = "union of all candidates"
+    for result in results.values():
+        result["recall"] = recall(result.pop("found"), expected)
+
+    print(f"\n{frame_count} frames, recall against the {reference}")
+    print(f"{'backend':<22}{'fps':>9}{'recall':>9}")
+    for spec, result in sorted(results.items(), key=lambda item: -item[1]["fps"]):
+        print(f"{spec:<22}{result['fps']:9.1f}{result['recall']:9.1%}")
+
+    passing = {spec: result for spec, result in results.items() if result["recall"] >= args.target_recall}
+    if not passing:
+        print(f"No backend reaches {args.target_recall:.0%} recall; nothing saved")
+        sys.exit(1)
+    best = max(passing, key=lambda spec: passing[spec]["fps"])
+    print(f"Fastest backend with recall >= {args.target_recall:.0%}: {best}")
+    if args.dry_run:
+        return
+
+    calibration = {"backend": best, "fps": passing[best]["fps"], "recall": passing[best]["recall"],
+                   "target_recall": args.target_recall, "footage": args.footage or "synthetic corpus",
+                   "frames": frame_count, "calibrated_at": datetime.now().isoformat(timespec="seconds"),
+                   "candidates": results}
+    with open(args.output, "w") as file:
+        json.dump(calibration, file, indent=2)
+    print(f"Saved to {args.output}" + (" (SCAN_BACKEND is set and overrides it)" if os.environ.get("SCAN_BACKEND") else ""))
+    print("Scanners that are already running (e.g. the Flask app) keep their backend until they are restarted")
+
+
+if __name__ == "__main__":
+    main()
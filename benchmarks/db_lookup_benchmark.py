@@ -0,0 +1,81 @@
+# Micro-benchmark: product lookups per second with the old open/query/close
+# pattern versus the persistent per-thread WAL connection in database.py,
+# with and without the in-process product cache
+#
+# Run from the repository root:
+#   python -m benchmarks.db_lookup_benchmark --products 5000 --lookups 20000
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import database
+
+
+# search_product as it was before the connection manager: a fresh connection per lookup
+def search_product_reconnecting(path, productID):
+    conn = sqlite3.connect(path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM inventory WHERE productID = ?", (productID,))
+    result = cursor.fetchone()
+    conn.close()
+    return result
+
+
+def populate(product_count):
+    database.initialize_database()
+    conn = database.connect_db()
+    conn.executemany(
+        "INSERT INTO inventory (category, productID, name, price, quantity, returnPeriod) VALUES (?, ?, ?, ?, ?, ?)",
+        [("Benchmark", f"{i:013d}", f"Product {i}", 1.0, 10, 30) for i in range(product_count)])
+    conn.commit()
+
+
+def lookups_per_second(search, product_ids):
+    started = time.perf_counter()
+    for productID in product_ids:
+        search(productID)
+    return len(product_ids) / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark inventory lookups per second")
+    parser.add_argument("--products", type=int, default=5000, help="products in the test database")
+    parser.add_argument("--lookups", type=int, default=20000, help="lookups per measurement")
+    parser.add_argument("--miss-rate", type=float, default=0.1, help="share of lookups for unknown IDs")
+    args = parser.parse_args()
+
+    random.seed(0)
+    product_ids = [f"{random.randrange(args.products):013d}" if random.random() >= args.miss_rate
+                   else f"unknown-{i}" for i in range(args.lookups)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "inventory.db")
+        database.set_database_path(path)
+        populate(args.products)
+
+        before = lookups_per_second(lambda productID: search_product_reconnecting(path, productID), product_ids)
+
+        cache_size = database.product_cache.maxsize
+        database.product_cache.maxsize = 0
+        after = lookups_per_second(database.search_product, product_ids)
+
+        database.product_cache.maxsize = cache_size
+        database.product_cache.clear()
+        cached = lookups_per_second(database.search_product, product_ids)
+        cache_stats = database.product_cache_stats()
+        database.close_db()
+
+    print(f"Lookups: {args.lookups} over {args.products} products ({args.miss_rate:.0%} misses)")
+    print(f"  connection per lookup:  {before:10.0f} lookups/s")
+    print(f"  persistent connection:  {after:10.0f} lookups/s")
+    print(f"  speedup:                {after / before:10.1f}x")
+    print(f"  with product cache:     {cached:10.0f} lookups/s "
+          f"(hit rate {cache_stats['hit_rate']:.0%}, {cache_stats['size']} cached rows)")
+
+
+if __name__ == "__main__":
+    main()
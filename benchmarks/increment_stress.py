@@ -0,0 +1,108 @@
+# Stress test for concurrent quantity increments
+#
+# Several processes hammer the same few product IDs with +1 increments, then
+# the final quantities are compared with the exact expected counts. Exits
+# with status 1 if a single increment was lost.
+#
+# Run from the repository root:
+#   python -m benchmarks.increment_stress --processes 8 --increments 2000
+#   python -m benchmarks.increment_stress --legacy   # old SELECT-then-UPDATE, loses increments
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+import database
+
+
+# The read-modify-write update_quantity used before increments became a single statement
+def legacy_increment(productID, quantity_change=1):
+    conn = database.connect_db()
+    cursor = conn.cursor()
+    cursor.execute("SELECT quantity FROM inventory WHERE productID = ?", (productID,))
+    result = cursor.fetchone()
+    if result:
+        cursor.execute("UPDATE inventory SET quantity = ? WHERE productID = ?", (result[0] + quantity_change, productID))
+    else:
+        cursor.execute("INSERT INTO inventory (category, productID, name, price, quantity, returnPeriod) VALUES (?, ?, ?, ?, ?, ?)",
+                       ("Uncategorized", productID, productID, 0.0, quantity_change, 0))
+    conn.commit()
+
+
+# Worker: apply a list of increments, return {productID: count applied}
+def run_worker(job):
+    path, product_ids, legacy = job
+    database.set_database_path(path)
+    increment = legacy_increment if legacy else database.increment_quantity
+
+    applied = {}
+    for productID in product_ids:
+        try:
+            increment(productID, 1)
+        except sqlite3.Error as error:  # Busy timeout, or (legacy path) two processes inserting the same new product
+            print(f"Increment failed for {productID}: {error}")
+            continue
+        applied[productID] = applied.get(productID, 0) + 1
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent increment stress test")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--increments", type=int, default=2000, help="increments per process")
+    parser.add_argument("--products", type=int, default=5, help="distinct product IDs (fewer = more contention)")
+    parser.add_argument("--legacy", action="store_true", help="use the old SELECT-then-UPDATE code path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "inventory.db")
+        database.set_database_path(path)
+        database.initialize_database()
+        database.close_db()
+
+        # Half the products exist up front, the rest are created on first sight by the increments
+        product_ids = [f"SKU{i:05d}" for i in range(args.products)]
+        for productID in product_ids[:args.products // 2]:
+            database.add_product("Stress", productID, productID, 1.0, 0, 0)
+        database.close_db()
+
+        rng = random.Random(0)
+        jobs = [(path, [rng.choice(product_ids) for _ in range(args.increments)], args.legacy)
+                for _ in range(args.processes)]
+
+        started = time.perf_counter()
+        with Pool(args.processes) as pool:
+            results = pool.map(run_worker, jobs)
+        elapsed = time.perf_counter() - started
+
+        expected = {productID: 0 for productID in product_ids}
+        for applied in results:
+            for productID, count in applied.items():
+                expected[productID] += count
+
+        conn = database.connect_db()
+        actual = dict(conn.execute("SELECT productID, quantity FROM inventory").fetchall())
+        database.close_db()
+
+    total = sum(expected.values())
+    lost = sum(expected[productID] - actual.get(productID, 0) for productID in product_ids)
+
+    print(f"{args.processes} processes x {args.increments} increments over {args.products} products "
+          f"({'legacy SELECT + UPDATE' if args.legacy else 'atomic increment'})")
+    print(f"Applied {total} increments in {elapsed:.2f} s: {total / elapsed:.0f} increments/s")
+    for productID in product_ids:
+        print(f"  {productID}: expected {expected[productID]}, got {actual.get(productID, 0)}")
+
+    if lost:
+        print(f"FAILED: {lost} increments lost")
+        sys.exit(1)
+    print("OK: every increment was counted exactly once")
+
+
+if __name__ == "__main__":
+    main()
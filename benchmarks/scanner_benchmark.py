@@ -0,0 +1,390 @@
+# Throughput, latency, memory and recall of every scanner entry point
+#
+# Runs each entry point over a synthetic corpus (see synthetic_corpus.py) and
+# reports, per entry point:
+#   fps          frames scanned per second of wall-clock time
+#   p50/p95/p99  per-frame latency: time between consecutive frames leaving the
+#                frame reader, i.e. what the scan loop spends on each frame
+#   peak MB      peak traced memory (Python and NumPy allocations; OpenCV's own
+#                buffers and decode worker processes are not included)
+#   RSS MB       how far the resident set size rose above where it was when a
+#                video's scan started, sampled after every frame (Linux only);
+#                unlike peak MB this includes OpenCV's and zbar's buffers
+#   recall       share of the codes in the corpus that were reported
+#
+# With --save-baseline the results are stored in scanner_baseline.json; later
+# runs compare against it and exit with status 1 when an entry point's
+# throughput drops more than --tolerance below its baseline or its recall drops
+# at all, when an entry point fails, or when a full run (no --entry-points) is
+# missing one that is in the baseline. Baselines only mean something on the
+# machine they were recorded on.
+# The report ends with the peak RSS of the benchmark process (ru_maxrss).
+#
+# Run from the repository root:
+#   python -m benchmarks.scanner_benchmark --save-baseline
+#   python -m benchmarks.scanner_benchmark --entry-points decode_frame integrated_app
+#   python -m benchmarks.scanner_benchmark --corpus corpus/   # reuse a generated corpus
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import cv2
+import numpy as np
+
+from benchmarks.synthetic_corpus import generate_corpus, load_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SUBFOLDER = os.path.join(REPO_ROOT, "Barcode_Scanner_Video_Processing_database")
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scanner_baseline.json")
+
+
+# Resident set size of this process in bytes, or None where /proc isn't available
+def current_rss():
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+# Highest RSS this process ever had, in bytes
+def max_rss():
+    kilobytes_or_bytes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return kilobytes_or_bytes if sys.platform == "darwin" else kilobytes_or_bytes * 1024
+
+
+# Wraps frame_reader.read_frames and records the time between the frames it hands out
+# sample_rss: also track the highest RSS seen after each frame (reading /proc costs microseconds)
+class FrameTimer:
+
+    def __init__(self, sample_rss=False):
+        self.latencies = []
+        self.sample_rss = sample_rss
+        self.peak_rss = None
+
+    def read_frames(self, cap, *args, **kwargs):
+        from frame_reader import read_frames
+
+        last = time.perf_counter()
+        for item in read_frames(cap, *args, **kwargs):
+            yield item
+            now = time.perf_counter()
+            self.latencies.append(now - last)
+            last = now
+            if self.sample_rss:
+                rss = current_rss()
+                if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+                    self.peak_rss = rss
+
+
+# Replace read_frames with the timer's for the duration of the block, in the entry point's
+# module and in scan_engine (ScanEngine.read)
+@contextlib.contextmanager
+def timed_reader(module, timer):
+    modules = [m for m in (module, importlib.import_module("scan_engine")) if hasattr(m, "read_frames")]
+    originals = [m.read_frames for m in modules]
+    for m in modules:
+        m.read_frames = timer.read_frames
+    try:
+        yield
+    finally:
+        for m, original in zip(modules, originals):
+            m.read_frames = original
+
+
+# ---- Entry points: each scans one video and returns the decoded strings it reported ----
+
+def decode_loop(path, timer, decode):
+    cap = cv2.VideoCapture(path)
+    found = set()
+    for _, _, frame in timer.read_frames(cap):
+        found.update(obj.data.decode("utf-8") for obj in decode(frame))
+    cap.release()
+    return found
+
+
+def scan_decode_frame(path, timer):
+    from parallel_decode import decode_frame
+    return decode_loop(path, timer, decode_frame)
+
+
+def scan_parallel(path, timer):
+    from parallel_decode import decode_frames
+    cap = cv2.VideoCapture(path)
+    found = set()
+    for _, _, _, decoded_objects in decode_frames(timer.read_frames(cap), workers=None):
+        found.update(obj.data.decode("utf-8") for obj in decoded_objects)
+    cap.release()
+    return found
+
+
+def scan_roi_tracker(path, timer):
+    from roi_tracker import RoiTracker
+    return decode_loop(path, timer, RoiTracker().decode)
+
+
+def scan_decode_cascade(path, timer):
+    from decode_cascade import DecodeCascade
+    return decode_loop(path, timer, DecodeCascade().decode)
+
+
+def scan_tiled(path, timer):
+    from tiled_decode import TiledDecoder
+    return decode_loop(path, timer, TiledDecoder().decode)
+
+
+def scan_engine(path, timer):
+    from scan_engine import ScanEngine
+    cap = cv2.VideoCapture(path)
+    found = set()
+    for _, _, _, detections in ScanEngine(overlay=False).scan(timer.read_frames(cap)):
+        found.update(detection.data for detection in detections)
+    cap.release()
+    return found
+
+
+# scan_engine with the quality gate on: the recall difference to scan_engine is what the gate costs
+def scan_quality_gate(path, timer):
+    from scan_engine import ScanEngine
+    cap = cv2.VideoCapture(path)
+    found = set()
+    for _, _, _, detections in ScanEngine(quality_gate=True, overlay=False).scan(timer.read_frames(cap)):
+        found.update(detection.data for detection in detections)
+    cap.release()
+    return found
+
+
+def scan_integrated_app(path, timer):
+    module = importlib.import_module("integrated_code_scanner_app")
+    with timed_reader(module, timer):
+        return module.process_video(path)
+
+
+def scan_video_processing_app(path, timer):
+    module = importlib.import_module("app_barcode_scanner_video_processing")
+    with timed_reader(module, timer):
+        return [barcode["data"] for barcode in module.process_video(path)]
+
+
+def scan_scientific(path, timer):
+    module = importlib.import_module("barcode_scanner_Scientific_Computing_Concepts")
+    with timed_reader(module, timer):
+        return module.process_video(path)
+
+
+ENTRY_POINTS = {
+    "decode_frame": scan_decode_frame,
+    "parallel": scan_parallel,
+    "roi_tracker": scan_roi_tracker,
+    "decode_cascade": scan_decode_cascade,
+    "tiled": scan_tiled,
+    "scan_engine": scan_engine,
+    "quality_gate": scan_quality_gate,
+    "integrated_app": scan_integrated_app,
+    "video_processing_app": scan_video_processing_app,
+    "scientific": scan_scientific,
+}
+
+
+# zbar may report a UPC-A code as EAN-13 with a leading 0; count both spellings as the same code
+def normalize_code(data):
+    return data[1:] if len(data) == 13 and data.startswith("0") else data
+
+
+def run_case(scan, path, measure_memory):
+    timer = FrameTimer(sample_rss=measure_memory)
+    rss_before = current_rss()
+    started = time.perf_counter()
+    found = scan(path, timer)
+    seconds = time.perf_counter() - started
+    rss_growth = None
+    if rss_before is not None and timer.peak_rss is not None:
+        rss_growth = max(0, timer.peak_rss - rss_before)
+
+    peak_bytes = None
+    if measure_memory:  # Separate pass: tracing slows allocation down and would distort the timings
+        tracemalloc.start()
+        scan(path, FrameTimer())
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {"found": {normalize_code(data) for data in found}, "seconds": seconds, "latencies": timer.latencies,
+            "peak_bytes": peak_bytes, "rss_growth_bytes": rss_growth}
+
+
+# Run one entry point over the whole corpus and aggregate the results
+def benchmark_entry_point(name, corpus_folder, manifest, measure_memory):
+    scan = ENTRY_POINTS[name]
+    frames = expected = hits = 0
+    seconds = 0.0
+    latencies = []
+    peak_bytes = 0
+    rss_growth = None
+    by_symbology = {}
+
+    for video in manifest:
+        result = run_case(scan, os.path.join(corpus_folder, video["video"]), measure_memory)
+        codes = {normalize_code(code) for code in video["codes"]}
+        video_hits = len(codes & result["found"])
+
+        frames += len(result["latencies"])
+        seconds += result["seconds"]
+        latencies += result["latencies"]
+        peak_bytes = max(peak_bytes, result["peak_bytes"] or 0)
+        if result["rss_growth_bytes"] is not None:
+            rss_growth = max(rss_growth or 0, result["rss_growth_bytes"])
+        expected += len(codes)
+        hits += video_hits
+        symbology = by_symbology.setdefault(video["symbology"], [0, 0])
+        symbology[0] += video_hits
+        symbology[1] += len(codes)
+
+    latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "frames": frames,
+        "fps": frames / seconds if seconds else 0.0,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "peak_mb": peak_bytes / 1e6 if measure_memory else None,
+        "rss_mb": rss_growth / 1e6 if rss_growth is not None else None,
+        "recall": hits / expected if expected else 0.0,
+        "recall_by_symbology": {symbology: found / total for symbology, (found, total) in by_symbology.items()},
+    }
+
+
+def print_report(results):
+    print(f"{'entry point':<22}{'fps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak MB':>9}{'RSS MB':>9}"
+          f"{'recall':>8}  by symbology")
+    for name, result in results.items():
+        if "error" in result:
+            print(f"{name:<22}  failed: {result['error']}")
+            continue
+        peak = f"{result['peak_mb']:9.1f}" if result["peak_mb"] is not None else f"{'-':>9}"
+        rss = f"{result['rss_mb']:9.1f}" if result["rss_mb"] is not None else f"{'-':>9}"
+        symbologies = " ".join(f"{symbology}={recall:.0%}" for symbology, recall in result["recall_by_symbology"].items())
+        print(f"{name:<22}{result['fps']:9.1f}{result['p50_ms']:9.1f}{result['p95_ms']:9.1f}{result['p99_ms']:9.1f}"
+              f"{peak}{rss}{result['recall']:8.0%}  {symbologies}")
+
+    if resource is not None:
+        print(f"Peak RSS of the benchmark process: {max_rss() / 1e6:.1f} MB (decode worker processes not included)")
+
+
+# Regressions against the stored baseline, as printable messages
+# An entry point that failed, or that is in the baseline but wasn't run, counts as a regression
+# selected: the entry points asked for with --entry-points (None = all of them); baseline entries
+# outside a deliberate selection are not expected in the results
+def compare_with_baseline(results, baseline, tolerance, selected=None):
+    regressions = [f"{name}: in the baseline but not benchmarked" for name in baseline
+                   if name not in results and (selected is None or name in selected)]
+    for name, result in results.items():
+        if "error" in result:
+            regressions.append(f"{name}: failed ({result['error']})")
+            continue
+        if name not in baseline:
+            continue
+        floor = baseline[name]["fps"] * (1 - tolerance)
+        if result["fps"] < floor:
+            regressions.append(f"{name}: {result['fps']:.1f} fps is below the baseline "
+                               f"{baseline[name]['fps']:.1f} fps - {tolerance:.0%}")
+        if result["recall"] < baseline[name]["recall"]:
+            regressions.append(f"{name}: recall {result['recall']:.1%} is below the baseline "
+                               f"{baseline[name]['recall']:.1%}")
+    return regressions
+
+
+# Scanner modules write detected frames and inventory changes into the working directory;
+# keep all of that in a scratch folder, with every corpus code registered as a product so
+# the scripts that prompt for unknown products never do
+def prepare_environment(work_folder, manifest):
+    os.environ["INVENTORY_DB"] = os.path.join(work_folder, "inventory.db")
+    os.chdir(work_folder)
+    sys.path[:0] = [REPO_ROOT, SUBFOLDER]
+
+    import database
+    database.set_database_path(os.environ["INVENTORY_DB"])
+    database.initialize_database()
+    conn = database.connect_db()
+    conn.executemany(
+        "INSERT OR IGNORE INTO inventory (category, productID, name, price, quantity, returnPeriod) VALUES (?, ?, ?, ?, ?, ?)",
+        [("Benchmark", code, code, 1.0, 0, 0) for video in manifest for code in video["codes"]])
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the barcode scanners on a synthetic video corpus")
+    parser.add_argument("--corpus", help="folder with a generated corpus (default: generate a fresh one)")
+    parser.add_argument("--frames", type=int, default=60, help="frames per video when generating the corpus")
+    parser.add_argument("--entry-points", nargs="+", choices=ENTRY_POINTS, help="entry points to run (default: all)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass and RSS sampling")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare with / save to")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop, as a fraction")
+    parser.add_argument("--json", help="also write the full results to this file")
+    args = parser.parse_args()
+
+    baseline_path = os.path.abspath(args.baseline)
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    with tempfile.TemporaryDirectory() as work_folder:
+        corpus_folder = os.path.abspath(args.corpus) if args.corpus else os.path.join(work_folder, "corpus")
+        if args.corpus and os.path.exists(os.path.join(corpus_folder, "manifest.json")):
+            manifest = load_corpus(corpus_folder)
+        else:
+            manifest = generate_corpus(corpus_folder, frame_count=args.frames)
+
+        previous_folder = os.getcwd()
+        prepare_environment(work_folder, manifest)
+        results = {}
+        try:
+            for name in args.entry_points or ENTRY_POINTS:
+                print(f"Benchmarking {name}...")
+                try:
+                    results[name] = benchmark_entry_point(name, corpus_folder, manifest, not args.no_memory)
+                except Exception as error:
+                    results[name] = {"error": f"{type(error).__name__}: {error}"}
+        finally:
+            import database
+            database.close_db()
+            os.chdir(previous_folder)
+
+    print(f"\n{len(manifest)} videos, {sum(video['frames'] for video in manifest)} frames per entry point")
+    print_report(results)
+
+    if json_path:
+        with open(json_path, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.save_baseline:
+        baseline = {name: {"fps": result["fps"], "recall": result["recall"]}
+                    for name, result in results.items() if "error" not in result}
+        with open(baseline_path, "w") as file:
+            json.dump(baseline, file, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        print("No baseline stored yet, run with --save-baseline to record one")
+        return
+    with open(baseline_path) as file:
+        regressions = compare_with_baseline(results, json.load(file), args.tolerance, args.entry_points)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
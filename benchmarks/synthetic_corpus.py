@@ -0,0 +1,216 @@
+# Synthetic barcode videos with known contents, for benchmarking the scanners
+#
+# Every video shows `density` codes of one symbology on a noisy background,
+# drifting slowly so consecutive frames are not identical, at a given
+# resolution and Gaussian blur. The codes in each video are written to
+# manifest.json next to the videos, which is what recall is measured against.
+#
+# EAN-13, UPC-A and Code 128 (code set B) are drawn from their module
+# patterns here so the corpus needs nothing beyond OpenCV and NumPy; QR
+# codes come from cv2.QRCodeEncoder.
+#
+# Run from the repository root:
+#   python -m benchmarks.synthetic_corpus corpus/ --resolutions 640x480 1920x1080 --blurs 0 2
+
+import argparse
+import itertools
+import json
+import os
+import random
+
+import cv2
+import numpy as np
+
+SYMBOLOGIES = ("EAN13", "UPCA", "CODE128", "QRCODE")
+
+# Default matrix: every symbology at every one of these (resolution, blur sigma, codes per frame)
+DEFAULT_VARIANTS = (((640, 480), 0.0, 1), ((1280, 720), 1.0, 3), ((1920, 1080), 2.0, 6))
+
+MANIFEST = "manifest.json"
+
+# EAN-13 digit patterns (1 = bar): L and G for the left half, R for the right half
+EAN_L = ("0001101", "0011001", "0010011", "0111101", "0100011",
+         "0110001", "0101111", "0111011", "0110111", "0001011")
+EAN_G = ("0100111", "0110011", "0011011", "0100001", "0011101",
+         "0111001", "0000101", "0010001", "0001001", "0010111")
+EAN_R = ("1110010", "1100110", "1101100", "1000010", "1011100",
+         "1001110", "1010000", "1000100", "1001000", "1110100")
+# L/G choice for the six left-hand digits, selected by the first digit
+EAN_PARITY = ("LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+              "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL")
+
+# Code 128 bar/space widths for symbol values 0-105, then the stop pattern
+CODE128_WIDTHS = (
+    "212222", "222122", "222221", "121223", "121322", "131222", "122213", "122312", "132212", "221213",
+    "221312", "231212", "112232", "122132", "122231", "113222", "123122", "123221", "223211", "221132",
+    "221231", "213212", "223112", "312131", "311222", "321122", "321221", "312212", "322112", "322211",
+    "212123", "212321", "232121", "111323", "131123", "131321", "112313", "132113", "132311", "211313",
+    "231113", "231311", "112133", "112331", "132131", "113123", "113321", "133121", "313121", "211331",
+    "231131", "213113", "213311", "213131", "311123", "311321", "331121", "312113", "312311", "332111",
+    "314111", "221411", "431111", "111224", "111422", "121124", "121421", "141122", "141221", "112214",
+    "112412", "122114", "122411", "142112", "142211", "241211", "221114", "413111", "241112", "134111",
+    "111242", "121142", "121241", "114212", "124112", "124211", "411212", "421112", "421211", "212141",
+    "214121", "412121", "111143", "111341", "131141", "114113", "114311", "411113", "411311", "113141",
+    "114131", "311141", "411131", "211412", "211214", "211232",
+)
+CODE128_STOP = "2331112"
+CODE128_START_B = 104
+
+
+def ean_check_digit(digits):
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    return str((10 - total % 10) % 10)
+
+
+# Module string (1 = bar) for a 13-digit EAN-13 code
+def ean13_modules(code):
+    first, left, right = int(code[0]), code[1:7], code[7:]
+    tables = {"L": EAN_L, "G": EAN_G}
+    modules = "101"
+    modules += "".join(tables[parity][int(d)] for parity, d in zip(EAN_PARITY[first], left))
+    modules += "01010"
+    modules += "".join(EAN_R[int(d)] for d in right)
+    return modules + "101"
+
+
+# Module string for printable ASCII text in Code 128 set B
+def code128_modules(text):
+    values = [CODE128_START_B] + [ord(c) - 32 for c in text]
+    checksum = (values[0] + sum(i * v for i, v in enumerate(values[1:], 1))) % 103
+    widths = "".join(CODE128_WIDTHS[v] for v in values + [checksum]) + CODE128_STOP
+
+    modules = ""
+    for i, width in enumerate(widths):
+        modules += ("1" if i % 2 == 0 else "0") * int(width)
+    return modules
+
+
+# Grayscale image of a 1D code: module_px pixels per module, a quiet zone on both sides
+def linear_code_image(modules, module_px, height):
+    quiet = "0" * 10
+    row = np.array([0 if m == "1" else 255 for m in quiet + modules + quiet], dtype=np.uint8)
+    return np.tile(np.repeat(row, module_px), (height, 1))
+
+
+def qr_image(text, module_px):
+    image = cv2.QRCodeEncoder.create().encode(text)  # One pixel per module, quiet zone included
+    return cv2.resize(image, None, fx=module_px, fy=module_px, interpolation=cv2.INTER_NEAREST)
+
+
+# Random code of the given symbology, as the scanner should report it
+def random_code(symbology, rng):
+    if symbology == "EAN13":
+        digits = "".join(rng.choice("0123456789") for _ in range(12))
+        return digits + ean_check_digit(digits)
+    if symbology == "UPCA":
+        digits = "".join(rng.choice("0123456789") for _ in range(11))
+        return digits + ean_check_digit("0" + digits)
+    if symbology == "CODE128":
+        return "SKU-" + "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ0123456789") for _ in range(8))
+    if symbology == "QRCODE":
+        return "ITEM-" + "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ0123456789") for _ in range(10))
+    raise ValueError(f"Unknown symbology: {symbology}")
+
+
+# Grayscale image of one code, sized for a cell of the given width
+def code_image(symbology, code, cell_width):
+    if symbology == "QRCODE":
+        return qr_image(code, max(2, cell_width // 60))
+    if symbology == "CODE128":
+        modules = code128_modules(code)
+    else:
+        modules = ean13_modules("0" + code if symbology == "UPCA" else code)  # UPC-A is EAN-13 with a leading 0
+    module_px = max(2, cell_width // (len(modules) + 40))
+    return linear_code_image(modules, module_px, height=module_px * 30)
+
+
+# The frames of one video: density codes in a grid, drifting by up to `drift` pixels
+def render_frames(codes, symbology, resolution, blur, frame_count, drift=12, seed=0):
+    width, height = resolution
+    np_rng = np.random.default_rng(seed)
+    columns = int(np.ceil(np.sqrt(len(codes) * width / height)))
+    rows = int(np.ceil(len(codes) / columns))
+    cell_width, cell_height = width // columns, height // rows
+
+    images = [code_image(symbology, code, cell_width) for code in codes]
+    background = np_rng.integers(150, 230, (height, width), dtype=np.uint8)
+
+    for frame_idx in range(frame_count):
+        frame = background.copy()
+        offset = int(drift * np.sin(2 * np.pi * frame_idx / max(1, frame_count)))
+        for i, image in enumerate(images):
+            image_height, image_width = image.shape
+            image_height, image_width = min(image_height, cell_height - 2 * drift), min(image_width, cell_width)
+            x = (i % columns) * cell_width + (cell_width - image_width) // 2
+            y = (i // columns) * cell_height + (cell_height - image_height) // 2 + offset
+            y = min(max(0, y), height - image_height)
+            frame[y:y + image_height, x:x + image_width] = image[:image_height, :image_width]
+        if blur > 0:
+            frame = cv2.GaussianBlur(frame, (0, 0), blur)
+        frame = cv2.add(frame, np_rng.integers(0, 12, frame.shape, dtype=np.uint8))  # Sensor noise
+        yield cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+
+
+def write_video(path, frames, resolution, fps):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, resolution)
+    if not writer.isOpened():
+        raise OSError(f"Could not open video writer for {path}")
+    for frame in frames:
+        writer.write(frame)
+    writer.release()
+
+
+# Write one video per (symbology, resolution, blur, density) combination plus manifest.json
+# variants: (resolution, blur, density) tuples; None = DEFAULT_VARIANTS
+# Returns the manifest: a list of {"video", "symbology", "resolution", "blur", "density", "codes"}
+def generate_corpus(folder, symbologies=SYMBOLOGIES, variants=None, frame_count=60, fps=30, seed=0):
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(seed)
+    manifest = []
+
+    for symbology, (resolution, blur, density) in itertools.product(symbologies, variants or DEFAULT_VARIANTS):
+        name = f"{symbology.lower()}_{resolution[0]}x{resolution[1]}_blur{blur:g}_n{density}.avi"
+        codes = [random_code(symbology, rng) for _ in range(density)]
+        frames = render_frames(codes, symbology, resolution, blur, frame_count, seed=rng.randrange(1 << 30))
+        write_video(os.path.join(folder, name), frames, resolution, fps)
+        manifest.append({"video": name, "symbology": symbology, "resolution": list(resolution), "blur": blur,
+                         "density": density, "frames": frame_count, "codes": codes})
+        print(f"Generated {name}")
+
+    with open(os.path.join(folder, MANIFEST), "w") as file:
+        json.dump(manifest, file, indent=2)
+    return manifest
+
+
+def load_corpus(folder):
+    with open(os.path.join(folder, MANIFEST)) as file:
+        return json.load(file)
+
+
+def parse_resolution(text):
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic barcode videos with known contents")
+    parser.add_argument("folder", help="output folder for the videos and manifest.json")
+    parser.add_argument("--symbologies", nargs="+", default=list(SYMBOLOGIES), choices=SYMBOLOGIES)
+    parser.add_argument("--resolutions", nargs="+", type=parse_resolution,
+                        help="WIDTHxHEIGHT values; with --blurs/--densities the full cross product is generated")
+    parser.add_argument("--blurs", nargs="+", type=float, help="Gaussian blur sigmas (0 = sharp)")
+    parser.add_argument("--densities", nargs="+", type=int, help="codes per frame")
+    parser.add_argument("--frames", type=int, default=60, help="frames per video")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    variants = None
+    if args.resolutions or args.blurs or args.densities:
+        variants = list(itertools.product(args.resolutions or [(1280, 720)], args.blurs or [0.0],
+                                          args.densities or [1]))
+    manifest = generate_corpus(args.folder, args.symbologies, variants, args.frames, seed=args.seed)
+    print(f"{len(manifest)} videos written to {args.folder}")
+
+
+if __name__ == "__main__":
+    main()
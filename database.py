@@ -1,12 +1,155 @@
 # Inventory database management module
 
+import json
+import os
 import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from scan_metrics import metrics
+
+# Database file, override with the INVENTORY_DB environment variable or set_database_path()
+DB_PATH = os.environ.get("INVENTORY_DB", "inventory.db")
+
+# Connection settings: WAL lets readers run while a writer commits, and
+# synchronous=NORMAL only fsyncs at WAL checkpoints instead of on every commit
+DB_SYNCHRONOUS = os.environ.get("INVENTORY_DB_SYNCHRONOUS", "NORMAL")
+DB_CACHE_KB = int(os.environ.get("INVENTORY_DB_CACHE_KB", 8192))
+DB_BUSY_TIMEOUT = 30  # Seconds to wait for another writer before giving up
+DB_CACHED_STATEMENTS = 256  # Prepared statements kept per connection
+
+# One connection per thread (and per process, connections must not cross a fork)
+_local = threading.local()
 
 # Connect to the database (or create it if it doesn’t exist)
+# The connection is opened once per thread and reused by every call after that
 def connect_db():
-    conn = sqlite3.connect("inventory.db")  # Creates/opens the database file
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH and _local.pid == os.getpid():
+        return conn
+
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT, cached_statements=DB_CACHED_STATEMENTS)  # Creates/opens the database file
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_KB}")  # Negative = size in KiB
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+    _local.conn, _local.path, _local.pid = conn, DB_PATH, os.getpid()
     return conn
 
+# Close this thread's connection (the next call to connect_db() opens a new one)
+def close_db():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+
+# Roll back if a write fails. The connection outlives the call, so a failed statement would
+# otherwise leave its implicit transaction open: the thread's next BEGIN would fail and other
+# connections would see the database as locked
+@contextmanager
+def rollback_on_error(conn):
+    try:
+        yield
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+# Point this module at another database file
+def set_database_path(path):
+    global DB_PATH
+    close_db()
+    DB_PATH = path
+    product_cache.clear()
+
+# In-process cache for search_product
+# Keeps the most recently used rows (including "not found" results) for up to ttl seconds.
+# Writes made through this module update or drop the cached row; the ttl bounds how stale
+# a row can get when another process writes to the same database.
+# Every write-through bumps a generation counter, and a row read from the database is only
+# cached if no write happened while it was being read, so a lookup that raced an update
+# can't put the old quantity back into the cache.
+class ProductCache:
+
+    QUANTITY_COLUMN = 5  # Position of quantity in an inventory row
+
+    def __init__(self, maxsize=4096, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # productID -> (expires_at, row or None), oldest first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0  # Bumped by every write-through, see put()
+
+    # Returns (True, row) on a hit, (False, None) on a miss
+    def get(self, productID):
+        with self.lock:
+            entry = self.entries.get(productID)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(productID)
+                self.hits += 1
+                return True, entry[1]
+            if entry is not None:
+                del self.entries[productID]  # Expired
+            self.misses += 1
+            return False, None
+
+    # generation: self.generation from before the row was read; the row is dropped if a write happened since
+    def put(self, productID, row, generation=None):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[productID] = (time.monotonic() + self.ttl, row)
+            self.entries.move_to_end(productID)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    # Write-through for quantity changes: patch the cached row if there is one
+    def set_quantity(self, productID, quantity):
+        with self.lock:
+            self.generation += 1
+            entry = self.entries.get(productID)
+            if entry is None:
+                return
+            if entry[1] is None:
+                del self.entries[productID]  # Cached as "not found" but it exists now
+                return
+            row = list(entry[1])
+            row[self.QUANTITY_COLUMN] = quantity
+            self.entries[productID] = (entry[0], tuple(row))
+
+    def invalidate(self, productID):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(productID, None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"size": len(self.entries), "maxsize": self.maxsize, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": self.hits / lookups if lookups else 0.0}
+
+# Cache size (0 disables it) and entry lifetime in seconds
+product_cache = ProductCache(int(os.environ.get("INVENTORY_CACHE_SIZE", 4096)),
+                             float(os.environ.get("INVENTORY_CACHE_TTL", 30)))
+
+# Hit/miss counters of the search_product cache
+def product_cache_stats():
+    return product_cache.stats()
+
 # Initialize the database with a table for products
 def initialize_database():
     conn = connect_db()
@@ -24,8 +167,28 @@ def initialize_database():
         )
     ''')
 
+    # Barcodes scanned before they were registered, with how often they were scanned
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pending_products (
+            productID TEXT PRIMARY KEY,
+            scan_count INTEGER NOT NULL DEFAULT 0,
+            first_seen TEXT NOT NULL DEFAULT (datetime('now')),
+            last_seen TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    ''')
+
+    # Scan results of uploaded videos, keyed by content hash + scanner configuration
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scan_results (
+            cache_key TEXT PRIMARY KEY,
+            result TEXT NOT NULL,
+            created TEXT NOT NULL DEFAULT (datetime('now')),
+            last_used REAL NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS scan_results_last_used ON scan_results (last_used)")
+
     conn.commit()
-    conn.close()
     print("Database initialized successfully.")
 
 # Add a new product to the database
@@ -37,49 +200,190 @@ def add_product(category, productID, name, price, quantity, returnPeriod):
         cursor.execute("INSERT INTO inventory (category, productID, name, price, quantity, returnPeriod) VALUES (?, ?, ?, ?, ?, ?)",
                        (category, productID, name, price, quantity, returnPeriod))
         conn.commit()
+        product_cache.invalidate(productID)
         print(f"Added product: {name} (ID: {productID})")
     except sqlite3.IntegrityError:
+        conn.rollback()  # See rollback_on_error
         print(f"Error: Product ID {productID} already exists.")
-    finally:
-        conn.close()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+# RETURNING needs SQLite 3.35+, older libraries fall back to UPDATE + SELECT in one transaction
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Run a quantity-changing statement and return the product's new quantity (None if no row matched)
+# The change happens in a single statement, so concurrent scanners never lose an increment
+def _change_quantity(conn, sql, params, productID):
+    cursor = conn.cursor()
+    try:
+        with metrics.time("db_write"):
+            if HAS_RETURNING:
+                rows = cursor.execute(sql + " RETURNING quantity", params).fetchall()
+            else:
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(sql, params)
+                rows = cursor.execute("SELECT quantity FROM inventory WHERE productID = ? AND changes() > 0",
+                                      (productID,)).fetchall()
+            conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return rows[0][0] if rows else None
 
 # Update the quantity of a product in the database
 def update_quantity(productID, quantity_change):
     conn = connect_db()
-    cursor = conn.cursor()
-
-    # Retrieve the current quantity of the product
-    cursor.execute("SELECT quantity FROM inventory WHERE productID = ?", (productID,))
-    result = cursor.fetchone()
 
-    if result:
-        new_quantity = result[0] + quantity_change  # Add the change to the existing quantity
-        
-        # Update the quantity in the database
-        cursor.execute("UPDATE inventory SET quantity = ? WHERE productID = ?", (new_quantity, productID))
-        conn.commit()
-        
+    new_quantity = _change_quantity(conn, "UPDATE inventory SET quantity = quantity + ? WHERE productID = ?",
+                                    (quantity_change, productID), productID)
+    if new_quantity is not None:
+        product_cache.set_quantity(productID, new_quantity)
         print(f"Updated quantity for Product ID {productID}: New Quantity = {new_quantity}")
     else:
         print(f"Error: Product ID {productID} not found in inventory.")
+    return new_quantity
+
+# Atomically add quantity_change to a product, creating it on first sight
+# (with quantity = quantity_change and the given details) if it isn't in the inventory yet
+# Returns the new quantity
+def increment_quantity(productID, quantity_change=1, category="Uncategorized", name=None, price=0.0, returnPeriod=0):
+    conn = connect_db()
+
+    new_quantity = _change_quantity(conn, """
+        INSERT INTO inventory (category, productID, name, price, quantity, returnPeriod)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(productID) DO UPDATE SET quantity = quantity + excluded.quantity""",
+        (category, productID, name or productID, price, quantity_change, returnPeriod), productID)
+    product_cache.set_quantity(productID, new_quantity)
+    return new_quantity
+
+# Apply many quantity changes in a single transaction
+# changes: {productID: quantity_change}
+# Returns {productID: {"before": old_quantity, "after": new_quantity}}; product IDs
+# that are not in the inventory are left out and reported.
+def apply_quantity_changes(changes):
+    changes = {productID: change for productID, change in changes.items() if change}
+    if not changes:
+        return {}
+
+    conn = connect_db()
+    cursor = conn.cursor()
+
+    try:
+        with metrics.time("db_write"):
+            cursor.execute("BEGIN IMMEDIATE")  # Lock for writing so the "before" quantities stay exact
+
+            # Look up current quantities (in chunks, SQLite limits the number of ? per statement)
+            before = {}
+            product_ids = list(changes)
+            for i in range(0, len(product_ids), 500):
+                chunk = product_ids[i:i + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(f"SELECT productID, quantity FROM inventory WHERE productID IN ({placeholders})", chunk)
+                before.update(cursor.fetchall())
+
+            cursor.executemany("UPDATE inventory SET quantity = quantity + ? WHERE productID = ?",
+                               [(changes[productID], productID) for productID in before])
+            conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
 
-    conn.close()
+    missing = [productID for productID in changes if productID not in before]
+    if missing:
+        print(f"Error: Product IDs not found in inventory: {', '.join(missing)}")
+
+    for productID, quantity in before.items():
+        product_cache.set_quantity(productID, quantity + changes[productID])
+
+    print(f"Updated quantities for {len(before)} products in one transaction")
+    return {productID: {"before": quantity, "after": quantity + changes[productID]}
+            for productID, quantity in before.items()}
+
+# Collects quantity changes during a scan session and writes them in batches
+# flush_every: write after this many changes (0 = only on flush() / leaving the with block)
+class QuantityBatch:
+
+    def __init__(self, flush_every=0):
+        self.flush_every = flush_every
+        self.pending = {}  # productID -> summed quantity change not yet written
+        self.pending_events = 0
+        self.results = {}  # productID -> {"before": ..., "after": ...} across all flushes
+
+    def add(self, productID, quantity_change=1):
+        self.pending[productID] = self.pending.get(productID, 0) + quantity_change
+        self.pending_events += 1
+        if self.flush_every and self.pending_events >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        pending, self.pending, self.pending_events = self.pending, {}, 0
+
+        for productID, change in apply_quantity_changes(pending).items():
+            if productID in self.results:
+                self.results[productID]["after"] = change["after"]
+            else:
+                self.results[productID] = change
+        return self.results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+
+# Stored scan result for cache_key (see store_scan_result), or None
+# A hit marks the entry as recently used
+def get_scan_result(cache_key):
+    conn = connect_db()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT result FROM scan_results WHERE cache_key = ?", (cache_key,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+
+    with rollback_on_error(conn):
+        cursor.execute("UPDATE scan_results SET last_used = ? WHERE cache_key = ?", (time.time(), cache_key))
+        conn.commit()
+    return json.loads(row[0])
+
+# Store a JSON-serializable scan result under cache_key, then drop the least recently
+# used entries beyond max_entries (0 = don't keep any)
+def store_scan_result(cache_key, result, max_entries):
+    if max_entries <= 0:
+        return
+
+    conn = connect_db()
+    cursor = conn.cursor()
+
+    with rollback_on_error(conn):
+        cursor.execute('''
+            INSERT INTO scan_results (cache_key, result, last_used) VALUES (?, ?, ?)
+            ON CONFLICT(cache_key) DO UPDATE SET result = excluded.result, last_used = excluded.last_used
+        ''', (cache_key, json.dumps(result), time.time()))
+        cursor.execute('''
+            DELETE FROM scan_results WHERE cache_key NOT IN
+                (SELECT cache_key FROM scan_results ORDER BY last_used DESC LIMIT ?)
+        ''', (max_entries,))
+        conn.commit()
 
 # Remove a product from the inventory
 def remove_product(productID):
     conn = connect_db()
     cursor = conn.cursor()
 
-    cursor.execute("DELETE FROM inventory WHERE productID = ?", (productID,))
-    conn.commit()
+    with rollback_on_error(conn):
+        cursor.execute("DELETE FROM inventory WHERE productID = ?", (productID,))
+        conn.commit()
+    product_cache.invalidate(productID)
     
     if cursor.rowcount > 0:
         print(f"Product ID {productID} removed from inventory.")
     else:  
         print(f"Error: Product ID {productID} not found in inventory.")
 
-    conn.close()
-
 # Retrieve and display all products
 def get_all_products():
     conn = connect_db()
@@ -95,29 +399,104 @@ def get_all_products():
     else:
         print("No products found in inventory.")
 
-    conn.close()
-
-# Search for a product by product ID
+# Search for a product by product ID (answered from product_cache when possible)
 def search_product(productID):
+    cached, result = product_cache.get(productID)
+    if cached:
+        return result
+
     conn = connect_db()
     cursor = conn.cursor()
 
-    cursor.execute("SELECT * FROM inventory WHERE productID = ?", (productID,)) 
-    result = cursor.fetchone() 
+    generation = product_cache.generation  # Read before the SELECT, see ProductCache
+    with metrics.time("db_lookup"):
+        cursor.execute("SELECT * FROM inventory WHERE productID = ?", (productID,))
+        result = cursor.fetchone()
 
-    conn.close()
+    product_cache.put(productID, result, generation)
     return result  # Returns product info instead of printing it
 
+# Record a scan of a barcode that isn't in the inventory yet
+# Scanning keeps going; the product is registered later with resolve_pending_product()
+# Returns how many times the barcode has been scanned while pending
+def queue_pending_product(productID, scans=1):
+    conn = connect_db()
+    cursor = conn.cursor()
+
+    with metrics.time("db_write"), rollback_on_error(conn):
+        cursor.execute('''
+            INSERT INTO pending_products (productID, scan_count) VALUES (?, ?)
+            ON CONFLICT(productID) DO UPDATE SET scan_count = scan_count + excluded.scan_count,
+                                                 last_seen = datetime('now')
+        ''', (productID, scans))
+        conn.commit()
+
+        cursor.execute("SELECT scan_count FROM pending_products WHERE productID = ?", (productID,))
+        return cursor.fetchone()[0]
+
+# List the barcodes waiting to be registered, most recently scanned first
+# Each entry is (productID, scan_count, first_seen, last_seen)
+def get_pending_products():
+    conn = connect_db()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT productID, scan_count, first_seen, last_seen FROM pending_products ORDER BY last_seen DESC")
+    return cursor.fetchall()
+
+# Register a pending barcode as a product and apply the scans counted while it was pending
+# quantity is the starting stock; every pending scan adds 1 on top of it.
+# If the product was registered some other way in the meantime, only the scans are added.
+# Returns the product's quantity, or None if the barcode was not pending.
+def resolve_pending_product(productID, category, name, price, quantity, returnPeriod):
+    conn = connect_db()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT scan_count FROM pending_products WHERE productID = ?", (productID,))
+        pending = cursor.fetchone()
+        if pending is None:
+            conn.rollback()
+            print(f"Error: Product ID {productID} is not pending.")
+            return None
+
+        cursor.execute('''
+            INSERT INTO inventory (category, productID, name, price, quantity, returnPeriod)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(productID) DO UPDATE SET quantity = quantity + ?
+        ''', (category, productID, name, price, quantity + pending[0], returnPeriod, pending[0]))
+        cursor.execute("DELETE FROM pending_products WHERE productID = ?", (productID,))
+        cursor.execute("SELECT quantity FROM inventory WHERE productID = ?", (productID,))
+        new_quantity = cursor.fetchone()[0]
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    product_cache.invalidate(productID)
+    print(f"Registered pending product: {name} (ID: {productID}), {pending[0]} scans applied, quantity = {new_quantity}")
+    return new_quantity
+
+# Drop a pending barcode without registering it (e.g. a misread)
+def discard_pending_product(productID):
+    conn = connect_db()
+    cursor = conn.cursor()
+
+    with rollback_on_error(conn):
+        cursor.execute("DELETE FROM pending_products WHERE productID = ?", (productID,))
+        conn.commit()
+    return cursor.rowcount > 0
+
 # Function to reset the entire inventory table
 def reset_inventory():
     conn = connect_db()
     cursor = conn.cursor()
 
     cursor.execute("DROP TABLE IF EXISTS inventory")
+    product_cache.clear()
     initialize_database()  # Recreate the table after dropping it
 
     conn.commit()
-    conn.close()
     print("Inventory database has been reset.")
 
 # Automatically initialize the database when this script runs
@@ -0,0 +1,84 @@
+# Multi-resolution decode cascade
+#
+# Large labels decode fine on a downscaled image for a fraction of the cost,
+# so each frame is tried on the cheapest level first and only escalates to
+# full resolution, then to the Gaussian-blurred full-resolution image that
+# process_frame has always used, when the cheaper attempt finds nothing.
+# Results are mapped back to frame coordinates so overlays stay correct.
+
+import time
+
+from decoder_backends import DEFAULT_BACKEND, get_backend
+from frame_buffers import FrameBuffers
+from parallel_decode import SCAN_SYMBOLS, shift_decoded
+from scan_metrics import metrics
+
+# (scale, blur) tried in order; the last level matches the original process_frame
+DEFAULT_LEVELS = ((0.5, False), (1.0, False), (1.0, True))
+
+
+class DecodeCascade:
+
+    # buffers: FrameBuffers to preprocess into (shared with the caller's), a private one by default
+    # backend: decoder backend spec (see decoder_backends.py)
+    def __init__(self, levels=DEFAULT_LEVELS, symbols=SCAN_SYMBOLS, buffers=None, backend=DEFAULT_BACKEND):
+        self.levels = [(float(scale), bool(blur)) for scale, blur in levels]
+        self.buffers = buffers or FrameBuffers()
+        self.symbols = symbols
+        self.decoder = get_backend(backend, symbols)
+        self.attempts = [0] * len(self.levels)
+        self.hits = [0] * len(self.levels)
+        self.seconds = [0.0] * len(self.levels)
+        self.frames = 0
+        self.misses = 0
+
+    def _decode_level(self, gray_frame, scale, blur):
+        image = gray_frame
+        if scale != 1.0:
+            with metrics.time("resize"):
+                image = self.buffers.scale(gray_frame, scale)
+        if blur:
+            with metrics.time("blur"):
+                image = self.buffers.blur(image)
+
+        with metrics.time("decode"):
+            decoded_objects = self.decoder(image)
+        if scale != 1.0:
+            decoded_objects = [shift_decoded(obj, 0, 0, 1.0 / scale) for obj in decoded_objects]
+        return decoded_objects
+
+    # Decode a BGR (or grayscale) frame, returning objects in frame coordinates
+    def decode(self, frame):
+        self.frames += 1
+        with metrics.time("convert"):
+            gray_frame = self.buffers.gray(frame)
+
+        for level, (scale, blur) in enumerate(self.levels):
+            started = time.perf_counter()
+            decoded_objects = self._decode_level(gray_frame, scale, blur)
+            self.seconds[level] += time.perf_counter() - started
+            self.attempts[level] += 1
+
+            if decoded_objects:
+                self.hits[level] += 1
+                return decoded_objects
+
+        self.misses += 1
+        return []
+
+    # Per-level hit statistics for tuning the cascade
+    def stats(self):
+        return [
+            {"scale": scale, "blur": blur, "attempts": self.attempts[level], "hits": self.hits[level],
+             "ms_per_attempt": self.seconds[level] * 1000 / self.attempts[level] if self.attempts[level] else 0.0}
+            for level, (scale, blur) in enumerate(self.levels)
+        ]
+
+    def summary(self):
+        lines = [f"Decode cascade over {self.frames} frames ({self.misses} with no detection):"]
+        for level in self.stats():
+            hit_rate = level["hits"] / level["attempts"] * 100 if level["attempts"] else 0.0
+            lines.append(f"  scale {level['scale']:.2f}{' + blur' if level['blur'] else ''}: "
+                         f"{level['hits']}/{level['attempts']} hits ({hit_rate:.0f}%), "
+                         f"{level['ms_per_attempt']:.1f} ms per attempt")
+        return "\n".join(lines)
@@ -0,0 +1,182 @@
+# Pluggable decoder backends
+#
+# Every scanner used to call pyzbar.decode directly. A backend is anything
+# that takes a grayscale image and returns pyzbar-style Decoded tuples (data
+# as bytes, zbar symbology name, Rect, polygon of Points), so the rest of the
+# pipeline (shift_decoded, overlays, Detection) works the same whatever
+# decoded the image. Backends are named by a spec string:
+#
+#   zbar             pyzbar / libzbar (the original decoder)
+#   opencv_qr        cv2.QRCodeDetector.detectAndDecodeMulti, QR codes only
+#   opencv_barcode   cv2.barcode.BarcodeDetector, EAN/UPC (and CODE128 on newer OpenCV builds)
+#   opencv           both OpenCV detectors
+#   zbar,opencv      fallback chain: the next backend only runs when the previous found nothing
+#
+# get_backend(spec, symbols) builds (and caches, per process) the backend for
+# a spec; that way worker processes only need the spec string, not the
+# backend object. The spec the scanners use when none is given is, in order:
+# the SCAN_BACKEND environment variable, the one saved by
+# benchmarks/calibrate_backends.py in decoder_calibration.json, then zbar.
+# It is looked up once, when this module is first imported: a process that
+# is already running (the Flask app, a batch scan) keeps the backend it
+# started with until it is restarted. The calibration file describes this
+# machine, so it is not checked in (see .gitignore).
+
+import json
+import os
+import threading
+
+import cv2
+from pyzbar.locations import Point, Rect
+from pyzbar.pyzbar import Decoded, decode
+
+CALIBRATION_PATH = os.environ.get(
+    "SCAN_CALIBRATION", os.path.join(os.path.dirname(os.path.abspath(__file__)), "decoder_calibration.json"))
+
+
+# Decoded tuple from a decoded string, a symbology name and four corner points
+def make_decoded(data, symbology, points):
+    polygon = [Point(int(round(x)), int(round(y))) for x, y in points]
+    xs = [point.x for point in polygon]
+    ys = [point.y for point in polygon]
+    fields = {"data": data.encode("utf-8"), "type": symbology,
+              "rect": Rect(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)), "polygon": polygon,
+              "quality": 1, "orientation": None}
+    return Decoded(**{field: fields[field] for field in Decoded._fields})  # Older pyzbar has no orientation
+
+
+class ZbarBackend:
+    name = "zbar"
+
+    def __init__(self, symbols):
+        self.symbols = symbols
+
+    def __call__(self, image):
+        return decode(image, symbols=self.symbols)
+
+
+# OpenCV detectors keep state between calls, so every thread (tiled decoding) gets its own
+class _OpenCVBackend:
+
+    def __init__(self, symbols):
+        self.names = {symbol.name for symbol in symbols}
+        self.local = threading.local()
+
+    def detector(self):
+        detector = getattr(self.local, "detector", None)
+        if detector is None:
+            detector = self.local.detector = self.create_detector()
+        return detector
+
+
+class OpenCVQRBackend(_OpenCVBackend):
+    name = "opencv_qr"
+
+    def create_detector(self):
+        return cv2.QRCodeDetector()
+
+    def __call__(self, image):
+        if "QRCODE" not in self.names:
+            return []
+        ok, texts, points, _ = self.detector().detectAndDecodeMulti(image)
+        if not ok:
+            return []
+        return [make_decoded(text, "QRCODE", corners) for text, corners in zip(texts, points) if text]
+
+
+class OpenCVBarcodeBackend(_OpenCVBackend):
+    name = "opencv_barcode"
+
+    def __init__(self, symbols):
+        if not hasattr(cv2, "barcode"):
+            raise ValueError("opencv_barcode needs OpenCV 4.8+ (or opencv-contrib-python)")
+        super().__init__(symbols)
+
+    def create_detector(self):
+        return cv2.barcode.BarcodeDetector()
+
+    def __call__(self, image):
+        ok, texts, types, points = self.detector().detectAndDecodeWithType(image)
+        if not ok:
+            return []
+
+        decoded_objects = []
+        for text, symbology, corners in zip(texts, types, points):
+            symbology = symbology.replace("_", "").replace("-", "")  # "EAN_13" -> "EAN13", zbar's spelling
+            if symbology == "EAN13" and text.startswith("0") and "UPCA" in self.names:
+                symbology, text = "UPCA", text[1:]  # zbar reports UPC-A codes as 12-digit UPCA
+            if text and symbology in self.names:
+                decoded_objects.append(make_decoded(text, symbology, corners))
+        return decoded_objects
+
+
+# Everything the given backends find in one image
+class CombinedBackend:
+
+    def __init__(self, backends, name):
+        self.backends = backends
+        self.name = name
+
+    def __call__(self, image):
+        return [obj for backend in self.backends for obj in backend(image)]
+
+
+# Backends tried in order until one finds something
+class FallbackChain:
+
+    def __init__(self, backends):
+        self.backends = backends
+        self.name = ",".join(backend.name for backend in backends)
+
+    def __call__(self, image):
+        for backend in self.backends:
+            decoded_objects = backend(image)
+            if decoded_objects:
+                return decoded_objects
+        return []
+
+
+BACKENDS = {
+    "zbar": ZbarBackend,
+    "opencv_qr": OpenCVQRBackend,
+    "opencv_barcode": OpenCVBarcodeBackend,
+    "opencv": lambda symbols: CombinedBackend([OpenCVQRBackend(symbols), OpenCVBarcodeBackend(symbols)], "opencv"),
+}
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+# Backend for a spec string ("zbar", "opencv", "zbar,opencv_qr", ...), cached per process
+def get_backend(spec, symbols):
+    key = (spec, tuple(symbols))
+    backend = _backends.get(key)  # Called for every frame: only lock when building a new backend
+    if backend is not None:
+        return backend
+
+    names = [name.strip() for name in spec.split(",") if name.strip()]
+    unknown = [name for name in names if name not in BACKENDS]
+    if not names or unknown:
+        raise ValueError(f"Unknown decoder backend {spec!r} (choose from {', '.join(BACKENDS)})")
+    with _backends_lock:
+        if key not in _backends:
+            parts = [BACKENDS[name](symbols) for name in names]
+            _backends[key] = parts[0] if len(parts) == 1 else FallbackChain(parts)
+        return _backends[key]
+
+
+# Backend spec saved by the calibration command, or None
+def load_calibration(path=CALIBRATION_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file).get("backend")
+
+
+# Spec used when a scanner isn't given one
+def default_backend():
+    return os.environ.get("SCAN_BACKEND") or load_calibration() or "zbar"
+
+
+# Resolved once per process, like the other environment settings (restart to pick up a new calibration)
+DEFAULT_BACKEND = default_backend()
@@ -0,0 +1,56 @@
+# Reusable preprocessing buffers
+#
+# cv2.cvtColor, cv2.GaussianBlur and cv2.resize allocate a new array for
+# every frame unless they are given one to write into (dst=). At 1080p and
+# 30 fps the grayscale + blurred copies alone are ~120 MB/s of allocations.
+# FrameBuffers keeps one array per purpose ("gray", "blur", ...) and hands
+# out a view of it sized for the current image. Arrays only grow, so
+# varying sizes (ROI crops, cascade levels) stop allocating once the
+# largest size has been seen.
+#
+# The arrays are overwritten by the next frame: use them only for work that
+# finishes before then (zbar decodes synchronously, so that is fine), and
+# not for frames handed to another thread or process.
+
+import cv2
+import numpy as np
+
+
+class FrameBuffers:
+
+    def __init__(self):
+        self.arrays = {}  # name -> uint8 array at least as large as anything requested under that name
+        self.allocations = 0
+
+    # Writable (height, width) uint8 view for the given purpose
+    def get(self, name, height, width):
+        array = self.arrays.get(name)
+        if array is None or array.shape[0] < height or array.shape[1] < width:
+            if array is not None:
+                height_alloc, width_alloc = max(height, array.shape[0]), max(width, array.shape[1])
+            else:
+                height_alloc, width_alloc = height, width
+            array = self.arrays[name] = np.empty((height_alloc, width_alloc), dtype=np.uint8)
+            self.allocations += 1
+        return array[:height, :width]
+
+    # Grayscale version of a BGR (or already grayscale) frame
+    def gray(self, frame, name="gray"):
+        if frame.ndim == 2:
+            return frame
+        height, width = frame.shape[:2]
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.get(name, height, width))
+
+    # 5x5 Gaussian blur of a grayscale image
+    def blur(self, gray_frame, name="blur"):
+        height, width = gray_frame.shape
+        return cv2.GaussianBlur(gray_frame, (5, 5), 0, dst=self.get(name, height, width))
+
+    # Grayscale image resized by scale (INTER_AREA)
+    def scale(self, gray_frame, scale, name="scaled"):
+        height, width = gray_frame.shape
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        return cv2.resize(gray_frame, size, dst=self.get(name, size[1], size[0]), interpolation=cv2.INTER_AREA)
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
@@ -0,0 +1,64 @@
+# Shared frame reader for every scanner
+#
+# cap.read() decodes and converts every frame to BGR even when the caller is
+# going to throw it away. read_frames() only calls grab() (demux + codec
+# decode, no colour conversion or copy) for frames it skips and retrieve()
+# for frames it returns. When the gap to the next sampled frame is large, it
+# seeks with CAP_PROP_POS_FRAMES instead of grabbing through the gap.
+
+import cv2
+
+from scan_metrics import metrics
+
+# Gaps longer than this are seeked over instead of grabbed through.
+# Seeking restarts decoding at the previous keyframe, so it only pays off
+# when the gap is longer than a typical keyframe interval.
+SEEK_THRESHOLD = 60
+
+
+# True if the capture is a file we can seek in (cameras report no frame count)
+def is_seekable(cap):
+    return cap.get(cv2.CAP_PROP_FRAME_COUNT) > 0
+
+
+# Yield (frame_idx, timestamp_ms, frame) for every stride-th frame of an
+# opened capture, from frame start up to (not including) frame end.
+# timestamp_ms is the media time of the frame (CAP_PROP_POS_MSEC), not wall-clock time.
+def read_frames(cap, stride=1, start=0, end=None, seek_threshold=SEEK_THRESHOLD):
+    stride = max(1, int(stride))
+    seekable = is_seekable(cap)
+    frame_idx = 0
+
+    if start > 0:
+        if seekable:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+            frame_idx = start
+        else:
+            while frame_idx < start and cap.grab():
+                frame_idx += 1
+
+    while end is None or frame_idx < end:
+        with metrics.time("read"):
+            if not cap.grab():
+                break
+            timestamp_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+            ret, frame = cap.retrieve()
+        if not ret:
+            break
+        metrics.count("frames_read")
+        yield frame_idx, timestamp_ms, frame
+
+        next_idx = frame_idx + stride
+        if end is not None and next_idx >= end:
+            break
+
+        if seekable and next_idx - frame_idx - 1 > seek_threshold:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, next_idx)
+            frame_idx = next_idx
+            continue
+
+        frame_idx += 1
+        while frame_idx < next_idx:
+            if not cap.grab():
+                return
+            frame_idx += 1
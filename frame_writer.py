@@ -0,0 +1,189 @@
+# Background writer for annotated detection frames
+#
+# Encoding a full-resolution PNG and writing it to disk takes tens of
+# milliseconds, so saving moves off the decode loop onto a small pool of
+# writer threads fed by a bounded queue (cv2.imencode releases the GIL).
+# The format, quality, downscaling and crop-to-barcode are configurable, and
+# when the queue is full the writer drops or waits according to drop_policy.
+
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from scan_metrics import metrics
+
+# File extension and cv2.imwrite quality flag for each format
+FORMATS = {
+    "png": (".png", cv2.IMWRITE_PNG_COMPRESSION),  # quality = compression level 0-9
+    "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),  # quality = 0-100
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY),  # quality = 1-100
+}
+DEFAULT_QUALITY = {"png": 3, "jpg": 90, "webp": 90}
+
+# What save() does when the queue is full
+DROP_POLICIES = ("drop_newest", "drop_oldest", "block")
+
+
+class FrameWriter:
+
+    # image_format: "png", "jpg" or "webp"; quality: see FORMATS (None = format default)
+    # scale: resize factor applied before encoding (1.0 = full resolution)
+    # crop_to_barcode: save only the area around the rects passed to save(), grown by crop_margin
+    # workers / max_queue: writer threads and how many frames may wait for them
+    def __init__(self, output_folder, image_format="png", quality=None, scale=1.0, crop_to_barcode=False,
+                 crop_margin=0.25, workers=2, max_queue=16, drop_policy="drop_newest"):
+        image_format = image_format.lower().replace("jpeg", "jpg")
+        if image_format not in FORMATS:
+            raise ValueError(f"Unsupported image format: {image_format}")
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unsupported drop policy: {drop_policy}")
+
+        self.output_folder = output_folder
+        self.extension, quality_flag = FORMATS[image_format]
+        self.params = [quality_flag, DEFAULT_QUALITY[image_format] if quality is None else int(quality)]
+        self.scale = scale
+        self.crop_to_barcode = crop_to_barcode
+        self.crop_margin = crop_margin
+        self.drop_policy = drop_policy
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.frames_queued = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.write_errors = 0
+        self.bytes_written = 0
+        self.seconds_writing = 0.0
+
+        os.makedirs(output_folder, exist_ok=True)
+        self.threads = [threading.Thread(target=self._write_loop, name=f"frame-writer-{i}", daemon=True)
+                        for i in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    # Area around the given (x, y, w, h) rects, clipped to the frame
+    def _crop(self, frame, rects):
+        frame_height, frame_width = frame.shape[:2]
+        x0 = min(x for x, _, _, _ in rects)
+        y0 = min(y for _, y, _, _ in rects)
+        x1 = max(x + w for x, _, w, _ in rects)
+        y1 = max(y + h for _, y, _, h in rects)
+        pad_x = int((x1 - x0) * self.crop_margin)
+        pad_y = int((y1 - y0) * self.crop_margin)
+        return frame[max(0, y0 - pad_y):min(frame_height, y1 + pad_y),
+                     max(0, x0 - pad_x):min(frame_width, x1 + pad_x)]
+
+    # Queue a frame to be saved as <output_folder>/<name><extension>
+    # rects: barcode rects (x, y, w, h) used when crop_to_barcode is on
+    # Returns the file path, or None if the frame was dropped
+    def save(self, frame, name, rects=None):
+        if self.crop_to_barcode and rects:
+            frame = self._crop(frame, rects)
+        item = (frame.copy(), os.path.join(self.output_folder, name + self.extension))  # Caller may reuse its frame
+
+        if self.drop_policy == "block":
+            self.queue.put(item)
+        else:
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    if self.drop_policy == "drop_newest":
+                        self._count_drop()
+                        return None
+                    try:
+                        self.queue.get_nowait()  # drop_oldest: make room by discarding the oldest frame
+                        self.queue.task_done()
+                        self._count_drop()
+                    except queue.Empty:
+                        pass
+
+        with self.lock:
+            self.frames_queued += 1
+        return item[1]
+
+    def _count_drop(self):
+        with self.lock:
+            self.frames_dropped += 1
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+
+            frame, path = item
+            started = time.perf_counter()
+            try:
+                with metrics.time("encode"):
+                    if self.scale != 1.0:
+                        frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+                    ok, encoded = cv2.imencode(self.extension, frame, self.params)
+                if not ok:
+                    raise OSError(f"Could not encode {path}")
+                with metrics.time("file_write"), open(path, "wb") as file:
+                    file.write(encoded.tobytes())
+            except (OSError, cv2.error) as error:
+                print(f"Error: could not save frame {path}: {error}")
+                with self.lock:
+                    self.write_errors += 1
+            else:
+                with self.lock:
+                    self.frames_written += 1
+                    self.bytes_written += encoded.nbytes
+                    self.seconds_writing += time.perf_counter() - started
+            finally:
+                self.queue.task_done()
+
+    # Wait for every queued frame to be written
+    def flush(self):
+        self.queue.join()
+
+    # Flush and stop the writer threads
+    def close(self):
+        self.flush()
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+    def stats(self):
+        with self.lock:
+            return {"frames_written": self.frames_written, "frames_dropped": self.frames_dropped,
+                    "write_errors": self.write_errors, "bytes_written": self.bytes_written,
+                    "seconds_writing": self.seconds_writing}
+
+    def summary(self):
+        stats = self.stats()
+        per_frame = stats["seconds_writing"] * 1000 / stats["frames_written"] if stats["frames_written"] else 0.0
+        return (f"Frame writer: {stats['frames_written']} frames written "
+                f"({stats['bytes_written'] / 1e6:.1f} MB, {per_frame:.1f} ms per frame in background), "
+                f"{stats['frames_dropped']} dropped, {stats['write_errors']} errors")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# FrameWriter configured from environment variables:
+# FRAME_FORMAT (png/jpg/webp), FRAME_QUALITY, FRAME_SCALE, FRAME_CROP=1,
+# FRAME_WRITER_THREADS, FRAME_WRITER_QUEUE, FRAME_DROP_POLICY
+def frame_writer_from_env(output_folder):
+    quality = os.environ.get("FRAME_QUALITY")
+    return FrameWriter(
+        output_folder,
+        image_format=os.environ.get("FRAME_FORMAT", "png"),
+        quality=int(quality) if quality else None,
+        scale=float(os.environ.get("FRAME_SCALE", 1.0)),
+        crop_to_barcode=os.environ.get("FRAME_CROP", "0") == "1",
+        workers=int(os.environ.get("FRAME_WRITER_THREADS", 2)),
+        max_queue=int(os.environ.get("FRAME_WRITER_QUEUE", 16)),
+        drop_policy=os.environ.get("FRAME_DROP_POLICY", "drop_newest"),
+    )
@@ -1,11 +1,24 @@
 import cv2
-import numpy as np
-from pyzbar.pyzbar import decode, ZBarSymbol
+import hashlib
+import json
 import os
+import threading
 import time
-from flask import Flask, request, jsonify
+import uuid
+from collections import Counter
+from flask import Flask, request, jsonify, Response, stream_with_context
 from werkzeug.utils import secure_filename
-from database import search_product, add_product, update_quantity, initialize_database  # Import database functions
+from database import (search_product, update_quantity, initialize_database, QuantityBatch, product_cache_stats,
+                      queue_pending_product, get_pending_products, resolve_pending_product, discard_pending_product,
+                      get_scan_result, store_scan_result)  # Import database functions
+from quality_gate import QualityGate
+from scan_engine import ScanEngine
+from frame_reader import read_frames
+from frame_writer import frame_writer_from_env
+from scan_dedup import ScanDeduplicator
+from scan_jobs import JobQueue, QueueFull
+from stream_ingest import StreamingVideo
+from scan_metrics import metrics
 
 # ==================== FLASK SETUP ====================
 app = Flask(__name__)
@@ -15,103 +28,195 @@ UPLOAD_FOLDER = "uploads"
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
+# Number of decode worker processes per upload (1 = serial)
+app.config["DECODE_WORKERS"] = int(os.environ.get("DECODE_WORKERS", 1))
+
+# Decode only around the last detection between periodic full-frame scans
+app.config["ROI_TRACKING"] = os.environ.get("ROI_TRACKING", "0") == "1"
+
+# Try a downscaled image first and only escalate to full resolution / blur on a miss
+app.config["DECODE_CASCADE"] = os.environ.get("DECODE_CASCADE", "0") == "1"
+
+# Decode high-resolution frames as overlapping tiles on a thread pool (not combinable with DECODE_CASCADE)
+app.config["TILED_DECODE"] = os.environ.get("TILED_DECODE", "0") == "1"
+
+# Skip motion-blurred / low-contrast frames before decode (QUALITY_GATE=audit also reports what that missed)
+app.config["QUALITY_GATE"] = os.environ.get("QUALITY_GATE", "0")
+
+# Inventory changes from an upload are written in one transaction every N scans (0 = once at the end)
+app.config["INVENTORY_FLUSH_EVERY"] = int(os.environ.get("INVENTORY_FLUSH_EVERY", 0))
+
+# Uploads are scanned by background workers: how many run at once and how many may wait (more = HTTP 429)
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 2))
+app.config["JOB_QUEUE_SIZE"] = int(os.environ.get("JOB_QUEUE_SIZE", 8))
+
+# Results kept for re-uploaded videos, looked up by content hash (0 = always rescan)
+app.config["RESULT_CACHE_SIZE"] = int(os.environ.get("RESULT_CACHE_SIZE", 256))
+
 # ==================== BARCODE SCANNER SETUP ====================
 initialize_database()  # Automatically initialize the database when script runs
-recently_scanned = {}  # Store recently scanned barcodes with timestamps
 SCAN_RESET_TIME = 5  # Threshold to prevent duplicate scans (in seconds)
+recently_scanned = ScanDeduplicator(SCAN_RESET_TIME)  # Recently scanned barcodes (wall-clock time)
+
+# Engine for single frames passed to process_frame without one (no per-video state)
+scan_engine = ScanEngine()
+
+# Count one scan of a barcode: duplicate check, then the inventory update or pending queue
+# batch (a QuantityBatch) collects quantity changes instead of writing each one immediately
+# dedup / scan_time: duplicate filter and the time of the scan in seconds;
+# video files pass their own ScanDeduplicator and the frame's media time
+# counted (a Counter) tallies the scans that were not duplicates, per barcode
+def record_scan(barcode_text, batch=None, dedup=None, scan_time=None, counted=None):
+    print(f"Scanned: {barcode_text}")
+
+    # Not `dedup or ...`: an empty ScanDeduplicator is falsy (it has __len__)
+    if (dedup if dedup is not None else recently_scanned).is_duplicate(barcode_text, scan_time):
+        print(f"Skipping duplicate scan for {barcode_text}")
+        metrics.count("duplicate_scans")
+        return
+    if counted is not None:
+        counted[barcode_text] += 1
+
+    product = search_product(barcode_text)
+    if product:
+        if batch is not None:
+            batch.add(barcode_text, 1)
+        else:
+            update_quantity(barcode_text, 1)
+        print(f"Updated inventory for Product ID {barcode_text}")
+    else:
+        # Queue unknown products for registration (see /pending) instead of blocking on input()
+        scan_count = queue_pending_product(barcode_text)
+        print(f"Product {barcode_text} not found in inventory. Queued as pending ({scan_count} scans)")
 
 # Barcode/QR code detection function for image frames
-def process_frame(frame):
-    detected = False
-    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    blurred_frame = cv2.GaussianBlur(gray_frame, (5, 5), 0)
-
-    processed_barcodes = set()
-    detected_barcodes = []
-
-    decoded_objects = decode(
-        blurred_frame,
-        symbols=[ZBarSymbol.QRCODE, ZBarSymbol.EAN13, ZBarSymbol.UPCA, ZBarSymbol.CODE128]
-    )
-
-    for obj in decoded_objects:
-        decoded_text = obj.data.decode('utf-8')
-
-        if decoded_text not in processed_barcodes:
-            detected = True
-            processed_barcodes.add(decoded_text)
-            detected_barcodes.append(decoded_text)
-
-            # Draw bounding box
-            points = obj.polygon
-            if len(points) == 4:
-                pts = np.array(points, dtype=np.int32).reshape((-1, 1, 2))
-                cv2.polylines(frame, [pts], isClosed=True, color=(0, 255, 0), thickness=2)
-
-            x, y, w, h = obj.rect
-            cv2.putText(frame, f"{obj.type}: {decoded_text}", (x, y - 10),
-                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-
-            print(f"Scanned: {decoded_text}")
-
-            current_time = time.time()
-            if decoded_text in recently_scanned and (current_time - recently_scanned[decoded_text]) < SCAN_RESET_TIME:
-                print(f"Skipping duplicate scan for {decoded_text}")
-                continue
-
-            recently_scanned[decoded_text] = current_time
-
-            product = search_product(decoded_text)
-            if product:
-                update_quantity(decoded_text, 1)
-                print(f"Updated inventory for Product ID {decoded_text}")
-            else:
-                print(f"Product {decoded_text} not found in inventory.")
-                category = input("Enter category: ")
-                name = input("Enter product name: ")
-                price = float(input("Enter price: "))
-                quantity = int(input("Enter quantity: "))
-                return_period = int(input("Enter return period (days): "))
-
-                add_product(category, decoded_text, name, price, quantity, return_period)
-                print(f"Added new product: {name} (ID: {decoded_text})")
-
-    return frame, detected, detected_barcodes
-
-# Function to process uploaded video files
-def process_video(file_path):
-    cap = cv2.VideoCapture(file_path)
-    if not cap.isOpened():
-        print("Error: Could not open video file.")
-        return []
+# decoded_objects can be passed in when the decode already ran in a worker process
+# engine: ScanEngine to detect with (default: scan_engine); other options as for record_scan
+def process_frame(frame, decoded_objects=None, batch=None, dedup=None, scan_time=None, counted=None, engine=None):
+    frame, detections = (engine or scan_engine).process_frame(frame, decoded_objects)
+    for detection in detections:
+        record_scan(detection.data, batch, dedup, scan_time, counted)
+    return frame, bool(detections), [detection.data for detection in detections]
 
+# Engine configured from the app settings (one per video: it keeps ROI / cascade state between frames)
+# overlay=False leaves frames undrawn; scan_frames only draws the ones it saves
+def make_scan_engine(workers=1, track_roi=False, cascade=False, overlay=True):
+    quality_gate = app.config["QUALITY_GATE"]
+    return ScanEngine(roi_tracking=track_roi, cascade=cascade, tiles=app.config["TILED_DECODE"] and not cascade,
+                      quality_gate=QualityGate(audit=True) if quality_gate == "audit" else quality_gate == "1",
+                      overlay=overlay, workers=workers)
+
+# Scan (frame_idx, timestamp_ms, frame) tuples from any source (a video file, a streamed upload)
+# and yield one event per newly detected barcode:
+# {"data", "type", "frame", "timestamp_ms", "saved_frame"}
+# workers > 1 decodes frames on that many processes, None picks one per spare core
+# track_roi decodes a crop around the last detection instead (serial, since each frame depends on the last)
+# cascade decodes each frame low resolution first, escalating on a miss (serial, keeps per-level stats)
+# batch (a QuantityBatch) collects the inventory changes; it is flushed when scanning ends
+# counted: see record_scan
+def scan_frames(frames, workers=1, track_roi=False, cascade=False, batch=None, counted=None):
     output_folder = os.path.join(os.getcwd(), "detected_frames")
-    os.makedirs(output_folder, exist_ok=True)
+    frame_writer = frame_writer_from_env(output_folder)  # Saves frames in the background
 
-    frame_idx = 0
     barcode_detected_count = 0
     detected_barcodes_across_frames = set()
+    dedup = ScanDeduplicator(SCAN_RESET_TIME)  # Uses video time, so results don't depend on processing speed
+    engine = make_scan_engine(workers, track_roi, cascade, overlay=False)
 
-    while cap.isOpened():
-        ret, frame = cap.read()
-        if not ret:
-            break
+    try:
+        for frame_idx, timestamp_ms, processed_frame, detections in engine.scan(frames):
+            for detection in detections:
+                record_scan(detection.data, batch, dedup, timestamp_ms / 1000, counted)
 
-        processed_frame, detected, detected_barcodes = process_frame(frame)
+            drawn = False
+            for detection in detections:
+                if detection.data not in detected_barcodes_across_frames:
+                    detected_barcodes_across_frames.add(detection.data)
+                    barcode_detected_count += 1
+                    if not drawn:  # Most frames are never saved, so only annotate the ones that are
+                        engine.draw(processed_frame, detections)
+                        drawn = True
+                    frame_filename = frame_writer.save(processed_frame, f"detected_{frame_idx:04d}", [detection.rect])
+                    print(f"Saved barcode-detected frame: {frame_filename}" if frame_filename
+                          else "Frame writer queue full, detected frame not saved")
 
-        for barcode_text in detected_barcodes:
-            if barcode_text not in detected_barcodes_across_frames:
-                detected_barcodes_across_frames.add(barcode_text)
-                barcode_detected_count += 1
-                frame_filename = os.path.join(output_folder, f"detected_{frame_idx:04d}.png")
-                cv2.imwrite(frame_filename, processed_frame)
-                print(f"Saved barcode-detected frame: {frame_filename}")
+                    yield {"data": detection.data, "type": detection.type, "frame": frame_idx,
+                           "timestamp_ms": timestamp_ms, "saved_frame": frame_filename}
+    finally:
+        frame_writer.close()
+        if batch is not None:
+            batch.flush()
+        print(f"Video processing complete. {barcode_detected_count} unique barcodes detected.")
+        print(frame_writer.summary())
+        print(f"Product cache: {product_cache_stats()}")
+        print(engine.summary())  # Per-stage timings add up across uploads; they are served at /metrics
 
-        frame_idx += 1
+# Function to process uploaded video files (options as for scan_frames)
+# Returns the detected barcodes in the order they were first seen
+# Raises ValueError for a file OpenCV can't open, so the upload job fails instead of caching "no barcodes"
+def process_video(file_path, workers=1, track_roi=False, cascade=False, batch=None, counted=None):
+    cap = cv2.VideoCapture(file_path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video file")
+
+    barcodes = [event["data"] for event in scan_frames(read_frames(cap), workers, track_roi, cascade, batch, counted)]
 
     cap.release()
-    print(f"Video processing complete. {barcode_detected_count} unique barcodes detected.")
-    return list(detected_barcodes_across_frames)
+    return barcodes
+
+# Scan an uploaded video and build the /upload result (runs on a background job worker)
+# cache_key: store the detections under this key so a re-upload of the same video skips the decode
+def scan_upload(file_path, cache_key=None):
+    batch = QuantityBatch(app.config["INVENTORY_FLUSH_EVERY"])
+    counted = Counter()
+    barcodes = process_video(file_path, app.config["DECODE_WORKERS"], app.config["ROI_TRACKING"],
+                             app.config["DECODE_CASCADE"], batch, counted)
+    if cache_key is not None:
+        store_scan_result(cache_key, {"barcodes": barcodes, "scans": counted}, app.config["RESULT_CACHE_SIZE"])
+    return upload_result(barcodes, batch)
+
+def upload_result(barcodes, batch):
+    pending = [pending_product_json(row) for row in get_pending_products() if row[0] in barcodes]
+    return {"barcodes": barcodes, "inventory": batch.results, "pending": pending}
+
+# Apply the inventory changes of a cached scan result, as if the video had been scanned again
+def replay_scan_result(cached):
+    batch = QuantityBatch()
+    for productID, scans in cached["scans"].items():
+        if search_product(productID):
+            batch.add(productID, scans)
+        else:
+            queue_pending_product(productID, scans)
+    batch.flush()
+    return upload_result(cached["barcodes"], batch)
+
+# Everything that changes what a scan detects; part of the result cache key, so changing it forces a rescan
+def scanner_config():
+    engine = make_scan_engine(track_roi=app.config["ROI_TRACKING"], cascade=app.config["DECODE_CASCADE"])
+    return {**engine.config(), "reset_time": SCAN_RESET_TIME}
+
+def result_cache_key(content_hash):
+    config_hash = hashlib.sha256(json.dumps(scanner_config(), sort_keys=True).encode()).hexdigest()
+    return f"{content_hash}:{config_hash[:16]}"
+
+# Save an uploaded file in chunks, hashing it on the way; returns the SHA-256 hex digest
+def save_upload(file, file_path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(file_path, "wb") as output:
+        while True:
+            chunk = file.stream.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            output.write(chunk)
+    return digest.hexdigest()
+
+def pending_product_json(row):
+    productID, scan_count, first_seen, last_seen = row
+    return {"productID": productID, "scan_count": scan_count, "first_seen": first_seen, "last_seen": last_seen}
+
+scan_jobs = JobQueue(scan_upload, app.config["JOB_WORKERS"], app.config["JOB_QUEUE_SIZE"])
+stream_slots = threading.BoundedSemaphore(app.config["JOB_WORKERS"])  # Streamed uploads scanned at once
 
 # ==================== FLASK ROUTES ====================
 
@@ -126,6 +231,7 @@ def home():
         </form>
     '''
 
+# Save the upload and queue it for scanning; returns the job ID right away (poll /jobs/<id>)
 @app.route("/upload", methods=["POST"])
 def upload_video():
     if "video" not in request.files:
@@ -135,12 +241,142 @@ def upload_video():
     if file.filename == "":
         return jsonify({"error": "No selected file"}), 400
 
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(file_path)
+    return submit_scan_job(scan_jobs, file, app.config["UPLOAD_FOLDER"])
+
+# Scan the raw request body while it is still arriving and report each barcode as it is found
+# The response is newline-delimited JSON: one {"event": "barcode", ...} line per new barcode, then
+# {"event": "done", "barcodes", "inventory", "pending", ...} (or {"event": "error"} if the scan failed)
+# e.g. curl -T video.mp4 "http://localhost:5000/upload/stream?filename=video.mp4"
+@app.route("/upload/stream", methods=["POST", "PUT"])
+def upload_video_stream():
+    if not stream_slots.acquire(blocking=False):
+        return jsonify({"error": "Too many videos being scanned, try again later"}), 429, {"Retry-After": "10"}
+
+    try:
+        filename = f"{uuid.uuid4().hex[:8]}_{secure_filename(request.args.get('filename', 'upload.mp4'))}"
+        video = StreamingVideo(request.stream, os.path.join(app.config["UPLOAD_FOLDER"], filename))
+        response = Response(stream_with_context(stream_scan_events(video)), mimetype="application/x-ndjson")
+    except Exception:
+        stream_slots.release()
+        raise
+    response.call_on_close(stream_slots.release)
+    return response
+
+def stream_scan_events(video):
+    started = time.perf_counter()
+    batch = QuantityBatch(app.config["INVENTORY_FLUSH_EVERY"])
+    barcodes = []
+    try:
+        for event in scan_frames(video.frames(), app.config["DECODE_WORKERS"], app.config["ROI_TRACKING"],
+                                 app.config["DECODE_CASCADE"], batch):
+            barcodes.append(event["data"])
+            event.update(event="barcode", elapsed_ms=round((time.perf_counter() - started) * 1000))
+            yield json.dumps(event) + "\n"
+
+        pending = [pending_product_json(row) for row in get_pending_products() if row[0] in barcodes]
+        yield json.dumps({"event": "done", "barcodes": barcodes, "inventory": batch.results, "pending": pending,
+                          "frames": video.frames_read, "bytes": video.bytes_received, "streamed": video.streamed,
+                          "elapsed_ms": round((time.perf_counter() - started) * 1000)}) + "\n"
+    except Exception as error:
+        yield json.dumps({"event": "error", "error": str(error)}) + "\n"
+    finally:
+        video.close()
+        print(video.summary())
+
+# Shared by every app that accepts uploads: save the file and queue the scan job
+# A video that was scanned before with the same configuration is answered right away (HTTP 200, "cached": true)
+def submit_scan_job(jobs, file, upload_folder):
+    if jobs.queue.full():
+        return jsonify({"error": "Too many videos waiting to be scanned, try again later"}), 429, {"Retry-After": "10"}
+
+    # Prefix the name so two uploads of the same file don't overwrite each other while queued
+    filename = f"{uuid.uuid4().hex[:8]}_{secure_filename(file.filename)}"
+    file_path = os.path.join(upload_folder, filename)
+    cache_key = result_cache_key(save_upload(file, file_path)) if app.config["RESULT_CACHE_SIZE"] > 0 else None
+
+    cached = get_scan_result(cache_key) if cache_key is not None else None
+    if cached is not None:
+        os.remove(file_path)  # Already scanned, no need to keep a second copy
+        return jsonify({**replay_scan_result(cached), "cached": True}), 200
+
+    try:
+        job_id = jobs.submit(file_path, cache_key)
+    except QueueFull:
+        os.remove(file_path)
+        return jsonify({"error": "Too many videos waiting to be scanned, try again later"}), 429, {"Retry-After": "10"}
+
+    return jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}",
+                    "result_url": f"/jobs/{job_id}/result"}), 202
+
+# Job status without the result
+def job_status_response(jobs, job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    job.pop("result")
+    job["queued_jobs"] = jobs.queued()
+    return jsonify(job), 200
+
+# Job result: 200 when done, 202 while queued/running, 500 if the scan failed
+def job_result_response(jobs, job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if job["status"] == "done":
+        return jsonify(job["result"]), 200
+    if job["status"] == "failed":
+        return jsonify({"error": job["error"]}), 500
+    return jsonify({"status": job["status"]}), 202
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    return job_status_response(scan_jobs, job_id)
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    return job_result_response(scan_jobs, job_id)
+
+# Per-stage timings and counters of every scan in this process, in Prometheus text format
+@app.route("/metrics", methods=["GET"])
+def scan_metrics():
+    return metrics_response()
+
+# Shared with the website app
+def metrics_response():
+    return Response(metrics.prometheus_text(), mimetype="text/plain; version=0.0.4")
+
+# Barcodes scanned but not registered yet
+@app.route("/pending", methods=["GET"])
+def list_pending_products():
+    return jsonify({"pending": [pending_product_json(row) for row in get_pending_products()]}), 200
+
+# Register a pending barcode; accepts JSON or form fields
+# category, name, price, returnPeriod and optionally quantity (starting stock, default 0)
+@app.route("/pending/<productID>", methods=["POST"])
+def register_pending_product(productID):
+    fields = request.get_json(silent=True) or request.form
+    try:
+        category = fields["category"]
+        name = fields["name"]
+        price = float(fields["price"])
+        quantity = int(fields.get("quantity", 0))
+        return_period = int(fields["returnPeriod"])
+    except KeyError as error:
+        return jsonify({"error": f"Missing field {error.args[0]}"}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "price, quantity and returnPeriod must be numbers"}), 400
+
+    new_quantity = resolve_pending_product(productID, category, name, price, quantity, return_period)
+    if new_quantity is None:
+        return jsonify({"error": f"Product ID {productID} is not pending"}), 404
+    return jsonify({"productID": productID, "quantity": new_quantity}), 200
 
-    barcodes = process_video(file_path)
-    return jsonify({"barcodes": barcodes}), 200
+# Drop a pending barcode (e.g. a misread)
+@app.route("/pending/<productID>", methods=["DELETE"])
+def delete_pending_product(productID):
+    if not discard_pending_product(productID):
+        return jsonify({"error": f"Product ID {productID} is not pending"}), 404
+    return jsonify({"productID": productID, "discarded": True}), 200
 
 # ==================== MAIN ====================
 if __name__ == "__main__":
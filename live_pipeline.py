@@ -0,0 +1,185 @@
+# Pipelined live camera scanning
+#
+# Capture, decode and display run as separate stages joined by small bounded
+# queues. The capture thread keeps draining the camera so its buffer never
+# backs up, the decode thread always works on the newest frame (stale frames
+# are dropped when decode falls behind), and the caller's thread handles
+# display and saving so cv2.imshow / cv2.waitKey stay on the main thread.
+
+import threading
+import time
+from collections import deque
+
+from frame_reader import read_frames
+
+# Marks the end of the stream in a stage queue
+END_OF_STREAM = object()
+
+# Bounded queue that drops its oldest item instead of blocking the producer.
+# Items put with keep=True (frames with detections, end of stream) are dropped
+# only after every plain item, so a slow consumer loses frames that carry no
+# results first. Keep items may push the queue past maxsize, but never past
+# max_keep: when a code is held in front of the camera every frame is a keep
+# item, and the oldest of them is dropped rather than letting the display
+# fall further and further behind. END_OF_STREAM is never dropped.
+class LatestQueue:
+
+    def __init__(self, maxsize=1, max_keep=16):
+        self.maxsize = maxsize
+        self.max_keep = max(maxsize, max_keep)
+        self.items = deque()
+        self.condition = threading.Condition()
+        self.dropped = 0
+        self.dropped_kept = 0  # Keep items dropped because the queue hit max_keep
+
+    def _drop_oldest(self, keep):
+        for i, (old_item, old_keep) in enumerate(self.items):
+            if old_keep == keep and old_item is not END_OF_STREAM:
+                del self.items[i]
+                return True
+        return False
+
+    def put(self, item, keep=False):
+        with self.condition:
+            if len(self.items) >= self.maxsize and self._drop_oldest(keep=False):
+                self.dropped += 1
+            elif len(self.items) >= self.max_keep and self._drop_oldest(keep=True):
+                self.dropped += 1
+                self.dropped_kept += 1
+            self.items.append((item, keep))
+            self.condition.notify()
+
+    # Return the next item, or None if nothing arrives within timeout
+    def get(self, timeout=None):
+        with self.condition:
+            if not self.items:
+                self.condition.wait(timeout)
+            if not self.items:
+                return None
+            return self.items.popleft()[0]
+
+
+# Capture-to-detection latency statistics (seconds)
+class LatencyStats:
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)  # Recent samples for percentiles
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, latency):
+        with self.lock:
+            self.samples.append(latency)
+            self.count += 1
+            self.total += latency
+            self.worst = max(self.worst, latency)
+
+    def percentile(self, pct):
+        with self.lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self):
+        if self.count == 0:
+            return "Capture-to-detection latency: no detections"
+        return (f"Capture-to-detection latency over {self.count} detections: "
+                f"mean {self.total / self.count * 1000:.1f} ms, "
+                f"p50 {self.percentile(50) * 1000:.1f} ms, "
+                f"p95 {self.percentile(95) * 1000:.1f} ms, "
+                f"max {self.worst * 1000:.1f} ms")
+
+
+# Runs capture and decode on background threads; iterate results() on the
+# main thread to display / save the processed frames.
+# process_frame(frame) must return (processed_frame, detected, detected_barcodes).
+class LivePipeline:
+
+    def __init__(self, cap, process_frame, queue_size=1):
+        self.cap = cap
+        self.process_frame = process_frame
+        self.decode_queue = LatestQueue(queue_size)
+        self.display_queue = LatestQueue(queue_size)
+        self.latency = LatencyStats()
+        self.stop_event = threading.Event()
+        self.error = None  # Exception that ended the capture or decode thread, re-raised by results()
+        self.frames_captured = 0
+        self.frames_decoded = 0
+        self.threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._decode_loop, name="decode", daemon=True),
+        ]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2)
+
+    # Both loops always end their queue with END_OF_STREAM, even when they fail,
+    # so results() can't wait forever on a dead thread
+    def _capture_loop(self):
+        try:
+            for frame_idx, timestamp_ms, frame in read_frames(self.cap):
+                if self.stop_event.is_set():
+                    break
+                self.decode_queue.put((frame_idx, time.perf_counter(), frame))
+                self.frames_captured += 1
+        except Exception as error:
+            self.error = self.error or error
+        finally:
+            self.decode_queue.put(END_OF_STREAM, keep=True)
+
+    def _decode_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                item = self.decode_queue.get(timeout=0.1)
+                if item is None:
+                    continue
+                if item is END_OF_STREAM:
+                    break
+
+                frame_idx, captured_at, frame = item
+                processed_frame, detected, detected_barcodes = self.process_frame(frame)
+                self.frames_decoded += 1
+
+                latency = None
+                if detected:
+                    latency = time.perf_counter() - captured_at
+                    self.latency.add(latency)
+
+                self.display_queue.put((frame_idx, processed_frame, detected_barcodes, latency), keep=detected)
+        except Exception as error:  # e.g. "database is locked" from the inventory update
+            self.error = self.error or error
+            self.stop_event.set()  # Stop capturing too
+        finally:
+            self.display_queue.put(END_OF_STREAM, keep=True)
+
+    # Yield (frame_idx, processed_frame, detected_barcodes, latency) on the
+    # caller's thread until the stream ends or stop() is called; an exception
+    # raised on the capture or decode thread is re-raised here
+    def results(self):
+        while True:
+            item = self.display_queue.get(timeout=0.1)
+            if item is END_OF_STREAM:
+                break
+            if self.stop_event.is_set() and self.error is None:
+                break
+            if item is not None:
+                yield item
+        if self.error is not None:
+            raise self.error
+
+    def summary(self):
+        return (f"Frames captured: {self.frames_captured}, decoded: {self.frames_decoded}, "
+                f"dropped before decode: {self.decode_queue.dropped}, "
+                f"dropped before display: {self.display_queue.dropped} "
+                f"({self.display_queue.dropped_kept} with detections)\n{self.latency.summary()}")
@@ -0,0 +1,72 @@
+# Scene-change gating: only send a frame to decode when its content changed
+#
+# Each frame is shrunk to a small grayscale thumbnail and compared with the
+# thumbnail of the last frame that was decoded. If fewer than changed_fraction
+# of the thumbnail pixels moved by more than pixel_threshold grey levels, the
+# frame is considered a repeat of something zbar already looked at and is
+# skipped. Comparing against the last decoded frame (not the previous frame)
+# means a slow pan still triggers a decode once it has drifted far enough.
+
+import cv2
+
+
+class MotionGate:
+
+    # width: thumbnail width in pixels (height keeps the aspect ratio)
+    # pixel_threshold: grey-level difference for a thumbnail pixel to count as changed
+    # changed_fraction: share of changed pixels needed to decode the frame
+    # max_skip: decode anyway after this many skipped frames in a row (0 = never)
+    def __init__(self, width=160, pixel_threshold=25, changed_fraction=0.01, max_skip=30):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.max_skip = max_skip
+
+        self.reference = None  # Thumbnail of the last decoded frame
+        self.skipped_in_a_row = 0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+
+    def reset(self):
+        self.reference = None
+        self.skipped_in_a_row = 0
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    # Share of thumbnail pixels that changed since the last decoded frame
+    def change_ratio(self, thumbnail):
+        diff = cv2.absdiff(thumbnail, self.reference)
+        changed = cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1])
+        return changed / diff.size
+
+    # True if the frame should go to decode
+    def should_decode(self, frame):
+        self.frames_seen += 1
+        thumbnail = self._thumbnail(frame)
+
+        if (self.reference is None
+                or self.reference.shape != thumbnail.shape
+                or (self.max_skip and self.skipped_in_a_row >= self.max_skip)
+                or self.change_ratio(thumbnail) >= self.changed_fraction):
+            self.reference = thumbnail
+            self.skipped_in_a_row = 0
+            return True
+
+        self.skipped_in_a_row += 1
+        self.frames_skipped += 1
+        return False
+
+    # Filter a stream of (frame_idx, timestamp_ms, frame) tuples down to the frames worth decoding
+    def filter(self, frames):
+        for frame_idx, timestamp_ms, frame in frames:
+            if self.should_decode(frame):
+                yield frame_idx, timestamp_ms, frame
+
+    def summary(self):
+        return f"Motion gate skipped {self.frames_skipped} of {self.frames_seen} frames"
@@ -0,0 +1,154 @@
+# Multi-process barcode decoding for process_video
+#
+# The reader (main process) pulls frames from the video and converts them to
+# grayscale, a pool of worker processes runs the blur + zbar decode half of
+# process_frame, and the results are handed back in frame order so the
+# drawing / database half of process_frame sees exactly what the serial path
+# would have seen.
+#
+# Workers are started with forkserver (spawn where that is unavailable)
+# rather than fork: the callers are multi-threaded (Flask request threads, the
+# frame writer, the tile pool, the live pipeline), and a forked child inherits
+# whatever locks those threads held at the time, OpenCV's and sqlite's
+# included, which can deadlock it.
+#
+# A worker started that way imports the main script again (as __mp_main__),
+# module-level setup included, so workers are expensive to start: every pool
+# size gets one long-lived pool per process, shared by all videos and shut
+# down when the process exits, instead of a new pool per video.
+
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+from pyzbar.locations import Point, Rect
+from pyzbar.pyzbar import ZBarSymbol
+
+from decoder_backends import DEFAULT_BACKEND, get_backend
+from scan_metrics import metrics
+
+# Symbols scanned by every process_frame variant
+SCAN_SYMBOLS = [ZBarSymbol.QRCODE, ZBarSymbol.EAN13, ZBarSymbol.UPCA, ZBarSymbol.CODE128]
+
+# Start method for decode worker processes (see the top of the file)
+POOL_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+_pools = {}  # workers -> ProcessPoolExecutor
+_pools_lock = threading.Lock()
+
+
+# Decode half of process_frame for a frame that is already grayscale
+# blur: smooth with a 5x5 Gaussian first (suppresses sensor noise, the default for every scanner)
+# backend: decoder backend spec (see decoder_backends.py)
+def decode_gray_frame(gray_frame, symbols=SCAN_SYMBOLS, blur=True, backend=DEFAULT_BACKEND):
+    if blur:
+        with metrics.time("blur"):
+            gray_frame = cv2.GaussianBlur(gray_frame, (5, 5), 0)
+    with metrics.time("decode"):
+        return get_backend(backend, symbols)(gray_frame)
+
+
+# Decode half of process_frame for a BGR frame
+def decode_frame(frame, symbols=SCAN_SYMBOLS, blur=True, backend=DEFAULT_BACKEND):
+    with metrics.time("convert"):
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return decode_gray_frame(gray_frame, symbols, blur, backend)
+
+
+# Map a result decoded on a crop / resized copy back to frame coordinates:
+# frame = (crop coordinate) * scale + (dx, dy)
+def shift_decoded(obj, dx, dy, scale=1.0):
+    left, top, width, height = obj.rect
+    return obj._replace(
+        rect=Rect(int(round(left * scale + dx)), int(round(top * scale + dy)),
+                  int(round(width * scale)), int(round(height * scale))),
+        polygon=[Point(int(round(x * scale + dx)), int(round(y * scale + dy))) for x, y in obj.polygon],
+    )
+
+
+# Default pool size: one core stays free for the reader
+def default_workers():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+# Process pool with `workers` processes shared by every decode_frames_parallel call in the process
+def shared_pool(workers):
+    with _pools_lock:
+        pool = _pools.get(workers)
+        if pool is None:
+            pool = _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT)
+        return pool
+
+
+# A pool whose worker died can't be used again: the next call starts a new one
+def discard_pool(workers, pool):
+    with _pools_lock:
+        if _pools.get(workers) is pool:
+            del _pools[workers]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@atexit.register
+def shutdown_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# Decode (frame_idx, timestamp_ms, frame) tuples from frame_reader.read_frames
+# on a pool of worker processes and yield (frame_idx, timestamp_ms, frame,
+# decoded_objects) in the same order the frames came in.
+# Only grayscale frames cross the process boundary (a third of the BGR size),
+# and at most max_pending frames are in flight so memory stays bounded.
+def decode_frames_parallel(frames, workers=None, max_pending=None, symbols=SCAN_SYMBOLS, blur=True,
+                           backend=DEFAULT_BACKEND):
+    workers = workers or default_workers()
+    max_pending = max_pending or workers * 2
+    pending = deque()
+
+    pool = shared_pool(workers)
+    try:
+        for frame_idx, timestamp_ms, frame in frames:
+            with metrics.time("convert"):
+                gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            future = pool.submit(decode_gray_frame, gray_frame, symbols, blur, backend)
+            pending.append((frame_idx, timestamp_ms, frame, future))
+
+            if len(pending) >= max_pending:
+                done_idx, done_ms, done_frame, future = pending.popleft()
+                yield done_idx, done_ms, done_frame, wait_for_decode(future)
+
+        while pending:
+            done_idx, done_ms, done_frame, future = pending.popleft()
+            yield done_idx, done_ms, done_frame, wait_for_decode(future)
+    except BrokenProcessPool:
+        discard_pool(workers, pool)
+        raise
+    finally:
+        # Consumer stopped early: don't decode frames nobody will read (the pool stays up for the next video)
+        for *_, future in pending:
+            future.cancel()
+
+
+# Result of a worker decode; the time the reader spends blocked on the pool is the "decode_wait" stage
+# (blur/decode themselves are timed in the worker processes)
+def wait_for_decode(future):
+    with metrics.time("decode_wait"):
+        return future.result()
+
+
+# Serial or parallel decode of (frame_idx, timestamp_ms, frame) tuples, same output either way
+def decode_frames(frames, workers=1, symbols=SCAN_SYMBOLS, blur=True, backend=DEFAULT_BACKEND):
+    if workers is not None and workers <= 1:
+        for frame_idx, timestamp_ms, frame in frames:
+            yield frame_idx, timestamp_ms, frame, decode_frame(frame, symbols, blur, backend)
+    else:
+        yield from decode_frames_parallel(frames, workers, symbols=symbols, blur=blur, backend=backend)
@@ -0,0 +1,104 @@
+# Image-quality gating: skip motion-blurred and washed-out frames before decode
+#
+# Handheld clips are full of frames smeared by motion, where zbar spends its
+# full time and finds nothing. Each frame is shrunk to a small grayscale
+# thumbnail and scored for sharpness (variance of the Laplacian) and contrast
+# (standard deviation of the grey levels). A frame is skipped when its
+# sharpness is below relative_threshold times the 75th percentile sharpness
+# of the last `window` frames, so the threshold follows the clip (a soft but
+# steady camera is not skipped wholesale, and a blurry stretch shorter than a
+# quarter of the window doesn't lower the bar), or when its contrast is below
+# min_contrast. After max_gap skipped frames in a row the next frame is
+# decoded anyway, so a label that is only ever seen blurred still gets tried.
+#
+# With audit=True the engine also decodes the skipped frames (which costs
+# what the gate saves) and the summary reports codes that were only visible
+# in skipped frames, i.e. the recall the gate cost on this video.
+
+from collections import deque
+
+import cv2
+import numpy as np
+
+
+class QualityGate:
+
+    # width: thumbnail width in pixels (height keeps the aspect ratio)
+    # window: recent frames the adaptive sharpness threshold is computed from
+    # percentile: percentile of their sharpness that counts as "sharp for this clip"
+    # relative_threshold: skip frames with less than this share of that sharpness
+    # min_contrast: skip frames whose grey-level standard deviation is below this
+    # max_gap: decode anyway after this many skipped frames in a row (0 = never)
+    # warmup: frames that are always decoded while the window fills up
+    # audit: decode skipped frames too and report what the gate would have missed
+    def __init__(self, width=320, window=60, percentile=75, relative_threshold=0.4, min_contrast=8.0, max_gap=10,
+                 warmup=5, audit=False):
+        self.width = width
+        self.percentile = percentile
+        self.relative_threshold = relative_threshold
+        self.min_contrast = min_contrast
+        self.max_gap = max_gap
+        self.warmup = warmup
+        self.audit = audit
+
+        self.recent = deque(maxlen=window)  # Sharpness of the most recent frames, decoded or not
+        self.skipped_in_a_row = 0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+        self.forced = 0  # Decodes forced by max_gap
+        self.decoded_codes = set()  # audit: codes found in decoded frames
+        self.skipped_codes = set()  # audit: codes found in skipped frames
+
+    def reset(self):
+        self.recent.clear()
+        self.skipped_in_a_row = 0
+
+    # (sharpness, contrast) of a BGR or grayscale frame
+    def score(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA) if width > self.width else frame
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        contrast = cv2.meanStdDev(small)[1][0, 0]
+        sharpness = cv2.meanStdDev(cv2.Laplacian(small, cv2.CV_16S))[1][0, 0] ** 2
+        return sharpness, contrast
+
+    # True if the frame should go to decode
+    def should_decode(self, frame):
+        self.frames_seen += 1
+        sharpness, contrast = self.score(frame)
+        threshold = None
+        if len(self.recent) >= self.warmup:
+            threshold = self.relative_threshold * np.percentile(self.recent, self.percentile)
+        self.recent.append(sharpness)
+
+        if threshold is None or (sharpness >= threshold and contrast >= self.min_contrast):
+            self.skipped_in_a_row = 0
+            return True
+        if self.max_gap and self.skipped_in_a_row >= self.max_gap:
+            self.skipped_in_a_row = 0
+            self.forced += 1
+            return True
+
+        self.skipped_in_a_row += 1
+        self.frames_skipped += 1
+        return False
+
+    # Filter a stream of (frame_idx, timestamp_ms, frame) tuples down to the frames worth decoding
+    # on_skip(frame) is called for every skipped frame (used by audit)
+    def filter(self, frames, on_skip=None):
+        for frame_idx, timestamp_ms, frame in frames:
+            if self.should_decode(frame):
+                yield frame_idx, timestamp_ms, frame
+            elif on_skip is not None:
+                on_skip(frame)
+
+    def summary(self):
+        line = (f"Quality gate skipped {self.frames_skipped} of {self.frames_seen} frames "
+                f"({self.forced} decodes forced after {self.max_gap} skips)")
+        if self.audit:
+            missed = self.skipped_codes - self.decoded_codes
+            line += (f"; audit: {len(self.skipped_codes)} codes in skipped frames, "
+                     f"{len(missed)} only there{': ' + ', '.join(sorted(missed)) if missed else ''}")
+        return line
@@ -0,0 +1,26 @@
+# Register barcodes that were scanned before they were in the inventory
+# The scanners queue unknown barcodes instead of stopping to ask for product
+# details; run this script to fill the details in afterwards.
+
+from database import initialize_database, get_pending_products, resolve_pending_product, discard_pending_product
+
+initialize_database()
+
+pending = get_pending_products()
+if not pending:
+    print("No pending products.")
+
+for productID, scan_count, first_seen, last_seen in pending:
+    print(f"\nProduct {productID}: scanned {scan_count} times (first {first_seen}, last {last_seen})")
+    action = input("Enter 'r' to register, 'd' to discard or anything else to skip: ")
+
+    if action == 'r':
+        category = input("Enter category: ")
+        name = input("Enter product name: ")
+        price = float(input("Enter price: "))
+        quantity = int(input("Enter starting quantity (scans are added on top): "))
+        return_period = int(input("Enter return period (days): "))
+        resolve_pending_product(productID, category, name, price, quantity, return_period)
+    elif action == 'd':
+        discard_pending_product(productID)
+        print(f"Discarded pending product {productID}")
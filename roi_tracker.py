@@ -0,0 +1,75 @@
+# Region-of-interest tracking for consecutive frames
+#
+# Once a code has been found, the next frames only decode an expanded crop
+# around where it was last seen instead of the whole frame. A full-frame scan
+# still runs every full_scan_every frames (to pick up new codes elsewhere in
+# the picture) and whenever the crop comes back empty.
+
+from parallel_decode import SCAN_SYMBOLS, decode_frame, shift_decoded
+
+
+class RoiTracker:
+
+    # margin: how far to grow the last bounding box on each side, as a share of its size
+    # min_size: smallest crop side in pixels, so tiny codes still get some context
+    # full_scan_every: force a full-frame scan after this many ROI-only frames
+    # decoder: function(frame) -> decoded objects used on crops and full frames,
+    # e.g. DecodeCascade().decode; defaults to decode_frame
+    def __init__(self, margin=0.5, min_size=96, full_scan_every=15, symbols=SCAN_SYMBOLS, decoder=None):
+        self.margin = margin
+        self.min_size = min_size
+        self.full_scan_every = full_scan_every
+        self.decoder = decoder or (lambda frame: decode_frame(frame, symbols))
+
+        self.roi = None  # (x0, y0, x1, y1) in frame coordinates
+        self.frames_since_full_scan = 0
+        self.roi_scans = 0
+        self.roi_hits = 0
+        self.full_scans = 0
+
+    def reset(self):
+        self.roi = None
+        self.frames_since_full_scan = 0
+
+    # Expanded box around every decoded object, clipped to the frame
+    def _roi_around(self, decoded_objects, frame_width, frame_height):
+        xs = [x for obj in decoded_objects for x, _ in obj.polygon]
+        ys = [y for obj in decoded_objects for _, y in obj.polygon]
+        if not xs:
+            for obj in decoded_objects:
+                left, top, width, height = obj.rect
+                xs += [left, left + width]
+                ys += [top, top + height]
+
+        x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+        pad_x = max((x1 - x0) * self.margin, (self.min_size - (x1 - x0)) / 2, 0)
+        pad_y = max((y1 - y0) * self.margin, (self.min_size - (y1 - y0)) / 2, 0)
+
+        return (max(0, int(x0 - pad_x)), max(0, int(y0 - pad_y)),
+                min(frame_width, int(x1 + pad_x)), min(frame_height, int(y1 + pad_y)))
+
+    # Decode a BGR frame, returning objects in full-frame coordinates
+    def decode(self, frame):
+        frame_height, frame_width = frame.shape[:2]
+
+        if self.roi is not None and self.frames_since_full_scan < self.full_scan_every:
+            x0, y0, x1, y1 = self.roi
+            self.roi_scans += 1
+            self.frames_since_full_scan += 1
+            decoded_objects = [shift_decoded(obj, x0, y0)
+                               for obj in self.decoder(frame[y0:y1, x0:x1])]
+            if decoded_objects:
+                self.roi_hits += 1
+                self.roi = self._roi_around(decoded_objects, frame_width, frame_height)
+                return decoded_objects
+
+        # No ROI yet, ROI came back empty, or a periodic full scan is due
+        self.full_scans += 1
+        self.frames_since_full_scan = 0
+        decoded_objects = self.decoder(frame)
+        self.roi = self._roi_around(decoded_objects, frame_width, frame_height) if decoded_objects else None
+        return decoded_objects
+
+    def summary(self):
+        return (f"ROI tracking: {self.roi_scans} ROI scans ({self.roi_hits} hits), "
+                f"{self.full_scans} full-frame scans")
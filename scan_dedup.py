@@ -0,0 +1,73 @@
+# Duplicate-scan suppression with TTL eviction and a memory cap
+#
+# A barcode that was counted less than ttl seconds ago is a duplicate. The
+# caller supplies the time: wall-clock time for a live camera, or the video
+# timestamp (CAP_PROP_POS_MSEC / 1000) for files, so an offline video dedups
+# the same way no matter how fast it is processed.
+#
+# Entries live in an OrderedDict in the order they were counted, which for a
+# monotonic clock is also the order they expire in. Each check first sweeps
+# expired entries off the front, so every entry is removed at most once and a
+# check costs O(1) amortized. max_entries caps memory on long-running cameras
+# by evicting the oldest entries early.
+#
+# One deduplicator can be shared between threads (the live scanner checks
+# codes on its decode thread while the 'r' key clears it on the main thread),
+# so checks and clears hold a lock.
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class ScanDeduplicator:
+
+    def __init__(self, ttl=5.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # barcode -> time it was last counted, oldest first
+        self.latest = None  # Newest time seen, to detect a clock that jumps backwards
+        self.duplicates = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    # Caller holds self.lock
+    def _sweep(self, now):
+        while self.entries:
+            barcode, counted_at = next(iter(self.entries.items()))
+            if now - counted_at < self.ttl:
+                break
+            del self.entries[barcode]
+
+    # True if barcode was already counted within ttl of now; otherwise record it and return False
+    # now defaults to time.monotonic()
+    def is_duplicate(self, barcode, now=None):
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            if self.latest is not None and now < self.latest:
+                self._clear()  # Time went backwards (new video, seek): old entries are meaningless
+            self.latest = now
+
+            self._sweep(now)
+            if barcode in self.entries:
+                self.duplicates += 1
+                return True
+
+            self.entries[barcode] = now
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evicted += 1
+            return False
+
+    def clear(self):
+        with self.lock:
+            self._clear()
+
+    def _clear(self):
+        self.entries.clear()
+        self.latest = None
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
@@ -0,0 +1,201 @@
+# One scan engine for every scanner
+#
+# process_frame used to exist in five slightly different copies (root and
+# subfolder CLIs, the Flask app, the video-processing app, the Scientific
+# Computing script), each with its own hard-coded symbol list, preprocessing
+# and overlay code. ScanEngine holds that configuration once:
+#
+#     engine = ScanEngine(roi_tracking=True, overlay=False)
+#     for frame_idx, timestamp_ms, frame, detections in engine.scan(engine.read(cap)):
+#         ...
+#
+# and keeps the state that carries over between frames (ROI tracker, decode
+# cascade statistics, motion gate reference). Detections come back as
+# Detection tuples with the text already decoded; what to do with them
+# (inventory updates, pending products, saving frames) stays with the caller.
+#
+# Engines are stateful: use one per video or camera, not one per process.
+#
+# The serial decode path preprocesses into the engine's FrameBuffers instead
+# of allocating new grayscale/blurred/scaled arrays per frame, and with
+# overlay=False nothing is drawn unless the caller asks for it with draw()
+# (e.g. only for the frames it saves). The parallel path still allocates one
+# grayscale array per frame, since it has to outlive the call while it is
+# queued for a worker process.
+
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from decode_cascade import DecodeCascade
+from decoder_backends import DEFAULT_BACKEND
+from frame_buffers import FrameBuffers
+from frame_reader import read_frames
+from motion_gate import MotionGate
+from parallel_decode import SCAN_SYMBOLS, decode_frame, decode_frames, decode_gray_frame
+from quality_gate import QualityGate
+from roi_tracker import RoiTracker
+from scan_metrics import metrics
+from tiled_decode import TiledDecoder
+
+# data: decoded text; type: symbology name ("QRCODE", "EAN13", ...)
+# rect: (left, top, width, height); polygon: corner points, both in frame coordinates
+Detection = namedtuple("Detection", ["data", "type", "rect", "polygon"])
+
+
+class ScanEngine:
+
+    # symbols: ZBar symbologies to decode
+    # backend: decoder backend spec, e.g. "zbar", "opencv" or the chain "zbar,opencv" (see decoder_backends.py)
+    # blur: 5x5 Gaussian blur before decoding (the preprocessing every process_frame used)
+    # stride: read() only returns every stride-th frame
+    # motion_gate: MotionGate instance, True for the defaults, False to decode every frame
+    # quality_gate: QualityGate instance (skips blurred / low-contrast frames), True for the defaults
+    # roi_tracking: decode around the last detection between periodic full-frame scans
+    # cascade: try a downscaled image first and only escalate on a miss (DecodeCascade)
+    # tiles: decode overlapping tiles on a thread pool (TiledDecoder instance, True for the defaults);
+    # an alternative to cascade, not combinable with it
+    # overlay: draw boxes and labels on processed frames (off for headless/batch use; draw() still works)
+    # workers: decode processes used by scan(); ROI tracking, the cascade and tiles decode in this process
+    def __init__(self, symbols=SCAN_SYMBOLS, blur=True, stride=1, motion_gate=False, quality_gate=False,
+                 roi_tracking=False, cascade=False, tiles=False, overlay=True, workers=1, backend=DEFAULT_BACKEND):
+        if cascade and tiles:
+            raise ValueError("cascade and tiles are alternative decoders, pick one")
+        self.symbols = list(symbols)
+        self.backend = backend
+        self.blur = blur
+        self.stride = max(1, int(stride))
+        self.overlay = overlay
+        self.workers = workers
+
+        self.buffers = FrameBuffers()
+        self.motion_gate = MotionGate() if motion_gate is True else (motion_gate or None)
+        self.quality_gate = QualityGate() if quality_gate is True else (quality_gate or None)
+        self.cascade = DecodeCascade(symbols=self.symbols, buffers=self.buffers, backend=backend) if cascade else None
+        if tiles is True:
+            tiles = TiledDecoder(symbols=self.symbols, blur=self.blur, buffers=self.buffers, backend=backend)
+        self.tiles = tiles or None
+        self.tracker = None
+        if roi_tracking:
+            self.tracker = RoiTracker(symbols=self.symbols, decoder=self._full_decoder())
+
+        self.frames_processed = 0
+        self.detections = 0
+
+    # Settings that change what gets detected (for cache keys and reports)
+    def config(self):
+        return {"symbols": [symbol.name for symbol in self.symbols], "backend": self.backend, "blur": self.blur,
+                "stride": self.stride,
+                "motion_gate": self.motion_gate is not None, "quality_gate": self.quality_gate is not None,
+                "roi_tracking": self.tracker is not None,
+                "cascade": self.cascade is not None, "tiles": self.tiles is not None}
+
+    def _decode(self, frame):
+        with metrics.time("convert"):
+            gray_frame = self.buffers.gray(frame)
+        if self.blur:
+            with metrics.time("blur"):
+                gray_frame = self.buffers.blur(gray_frame)
+        return decode_gray_frame(gray_frame, self.symbols, blur=False, backend=self.backend)
+
+    # Decoder for whole frames (and ROI crops): the cascade, the tiled decoder or a plain decode
+    def _full_decoder(self):
+        if self.cascade is not None:
+            return self.cascade.decode
+        if self.tiles is not None:
+            return self.tiles.decode
+        return self._decode
+
+    # Raw pyzbar results for one frame, in frame coordinates
+    def decode(self, frame):
+        if self.tracker is not None:
+            return self.tracker.decode(frame)
+        return self._full_decoder()(frame)
+
+    # Detections for one frame, one per distinct decoded text
+    # decoded_objects can be passed in when the decode already ran elsewhere (e.g. a worker process)
+    def detect(self, frame, decoded_objects=None):
+        if decoded_objects is None:
+            decoded_objects = self.decode(frame)
+
+        detections = []
+        seen = set()
+        for obj in decoded_objects:
+            data = obj.data.decode("utf-8")
+            if data in seen:
+                continue
+            seen.add(data)
+            detections.append(Detection(data, obj.type, obj.rect, obj.polygon))
+
+        if self.quality_gate is not None and self.quality_gate.audit:
+            self.quality_gate.decoded_codes.update(detection.data for detection in detections)
+        self.frames_processed += 1
+        self.detections += len(detections)
+        metrics.count("barcodes_decoded", len(detections))
+        return detections
+
+    # Draw a box and a "TYPE: data" label for every detection
+    def draw(self, frame, detections):
+        with metrics.time("overlay"):
+            for detection in detections:
+                if len(detection.polygon) == 4:
+                    pts = np.array(detection.polygon, dtype=np.int32).reshape((-1, 1, 2))
+                    cv2.polylines(frame, [pts], isClosed=True, color=(0, 255, 0), thickness=2)
+
+                x, y, w, h = detection.rect
+                cv2.putText(frame, f"{detection.type}: {detection.data}", (x, y - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
+        return frame
+
+    # Detect and (if overlay is on) annotate one frame; returns (frame, detections)
+    def process_frame(self, frame, decoded_objects=None):
+        detections = self.detect(frame, decoded_objects)
+        if self.overlay and detections:
+            self.draw(frame, detections)
+        return frame, detections
+
+    # (frame_idx, timestamp_ms, frame) tuples from an opened capture, every stride-th frame
+    def read(self, cap, start=0, end=None):
+        return read_frames(cap, self.stride, start, end)
+
+    # Scan (frame_idx, timestamp_ms, frame) tuples from any source and yield
+    # (frame_idx, timestamp_ms, frame, detections) for every frame that passed the motion and quality gates
+    def scan(self, frames):
+        if self.motion_gate is not None:
+            frames = self.motion_gate.filter(frames)
+        if self.quality_gate is not None:
+            frames = self.quality_gate.filter(frames, self._audit_skipped if self.quality_gate.audit else None)
+
+        if (self.tracker is None and self.cascade is None and self.tiles is None
+                and (self.workers is None or self.workers > 1)):
+            decoded_frames = decode_frames(frames, self.workers, self.symbols, self.blur, self.backend)
+        else:
+            decoded_frames = ((frame_idx, timestamp_ms, frame, self.decode(frame))
+                              for frame_idx, timestamp_ms, frame in frames)
+
+        for frame_idx, timestamp_ms, frame, decoded_objects in decoded_frames:
+            frame, detections = self.process_frame(frame, decoded_objects)
+            yield frame_idx, timestamp_ms, frame, detections
+
+    # Quality gate audit: decode a skipped frame anyway (without touching ROI / cascade state)
+    def _audit_skipped(self, frame):
+        decoded_objects = decode_frame(frame, self.symbols, self.blur, self.backend)
+        self.quality_gate.skipped_codes.update(obj.data.decode("utf-8") for obj in decoded_objects)
+
+    # Forget per-video state (ROI, motion reference, sharpness history) before scanning something else
+    def reset(self):
+        if self.tracker is not None:
+            self.tracker.reset()
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.quality_gate is not None:
+            self.quality_gate.reset()
+
+    def summary(self):
+        lines = [f"Scan engine: {self.detections} detections in {self.frames_processed} frames "
+                 f"({self.buffers.allocations} buffer allocations, {self.buffers.nbytes() / 1e6:.1f} MB reused)"]
+        for part in (self.motion_gate, self.quality_gate, self.tracker, self.cascade, self.tiles):
+            if part is not None:
+                lines.append(part.summary())
+        return "\n".join(lines)
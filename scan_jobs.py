@@ -0,0 +1,82 @@
+# Background job queue for video uploads
+#
+# /upload used to run process_video inside the request thread, holding a web
+# worker for the whole decode. Uploads are now submitted here and processed
+# by a fixed pool of worker threads (the decode itself releases the GIL and
+# can use its own process pool); clients poll the job for its status and
+# result. The queue is bounded, so when it is full submit() raises QueueFull
+# and the web tier answers 429 instead of piling up work.
+
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+QueueFull = queue.Full
+
+
+class JobQueue:
+
+    # run_job: function called with the arguments given to submit(); its return value is the job result
+    # workers: jobs processed at the same time
+    # max_queued: jobs allowed to wait for a worker before submit() raises QueueFull
+    # keep_finished: finished jobs remembered for polling (oldest forgotten first)
+    def __init__(self, run_job, workers=2, max_queued=8, keep_finished=200):
+        self.run_job = run_job
+        self.keep_finished = keep_finished
+        self.queue = queue.Queue(maxsize=max_queued)
+        self.jobs = OrderedDict()  # job_id -> job record, in submission order
+        self.lock = threading.Lock()
+
+        self.threads = [threading.Thread(target=self._work_loop, name=f"scan-job-{i}", daemon=True)
+                        for i in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    # Queue a job and return its ID; raises QueueFull when the queue is full
+    def submit(self, *args, **kwargs):
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "status": "queued", "submitted_at": time.time(),
+               "started_at": None, "finished_at": None, "result": None, "error": None}
+
+        with self.lock:
+            self.queue.put_nowait((job_id, args, kwargs))  # Raises QueueFull before the job is registered
+            self.jobs[job_id] = job
+        return job_id
+
+    def _work_loop(self):
+        while True:
+            job_id, args, kwargs = self.queue.get()
+            self._update(job_id, status="running", started_at=time.time())
+            try:
+                result = self.run_job(*args, **kwargs)
+            except Exception as error:
+                traceback.print_exc()
+                self._update(job_id, status="failed", error=str(error), finished_at=time.time())
+            else:
+                self._update(job_id, status="done", result=result, finished_at=time.time())
+            finally:
+                self.queue.task_done()
+                self._forget_old_jobs()
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _forget_old_jobs(self):
+        with self.lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job["status"] in ("done", "failed")]
+            for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self.jobs[job_id]
+
+    # Copy of a job record, or None for an unknown (or forgotten) job ID
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    # Jobs waiting for a worker
+    def queued(self):
+        return self.queue.qsize()
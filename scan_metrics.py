@@ -0,0 +1,151 @@
+# Per-stage timers and counters for the scan pipeline
+#
+# Each stage of the hot path (frame read, colour conversion, blur, zbar
+# decode, overlay drawing, SQLite calls, frame encoding/writing) is wrapped in
+#
+#     with metrics.time("decode"):
+#         ...
+#
+# which adds the elapsed time to an in-process histogram for that stage.
+# Counters (frames read, barcodes decoded, ...) are bumped with
+# metrics.count(). The Flask app serves everything as Prometheus text at
+# /metrics, and the CLI scripts print summary() when they finish.
+#
+# SCAN_METRICS=0 (or metrics.enabled = False) turns it off: time() then
+# returns one shared do-nothing context manager and count() returns at once.
+#
+# Stages timed inside decode worker processes (parallel decode) are recorded
+# in those processes and do not show up here.
+
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "started")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class Metrics:
+
+    def __init__(self, enabled=True, buckets=BUCKETS, prefix="barcode_scanner"):
+        self.enabled = enabled
+        self.buckets = buckets
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.histograms = {}  # stage -> [bucket counts (+Inf last), sum of seconds, count]
+        self.counters = {}  # name -> value
+
+    # Context manager that records how long its block took under stage
+    def time(self, stage):
+        if not self.enabled:
+            return NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            histogram[0][bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    # Everything in the Prometheus text exposition format
+    def prometheus_text(self):
+        with self.lock:
+            histograms = {stage: (list(buckets), total, count)
+                          for stage, (buckets, total, count) in self.histograms.items()}
+            counters = dict(self.counters)
+
+        name = f"{self.prefix}_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each stage of the scan pipeline",
+                 f"# TYPE {name} histogram"]
+        for stage, (buckets, total, count) in sorted(histograms.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, buckets):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+
+        for counter, value in sorted(counters.items()):
+            lines.append(f"# TYPE {self.prefix}_{counter}_total counter")
+            lines.append(f"{self.prefix}_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    # Upper bucket bound below which pct percent of a stage's samples fall
+    def _percentile(self, buckets, count, pct):
+        target = pct / 100 * count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, buckets):
+            cumulative += bucket_count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    # Table of stages by total time, for the end of CLI runs
+    def summary(self):
+        if not self.enabled:
+            return "Scan metrics disabled (SCAN_METRICS=0)"
+        with self.lock:
+            histograms = {stage: (list(buckets), total, count)
+                          for stage, (buckets, total, count) in self.histograms.items()}
+            counters = dict(self.counters)
+        if not histograms and not counters:
+            return "Scan metrics: nothing recorded"
+
+        grand_total = sum(total for _, total, _ in histograms.values()) or 1.0
+        lines = [f"{'stage':<16}{'calls':>9}{'total s':>10}{'mean ms':>10}{'p95 ms <=':>11}{'share':>8}"]
+        for stage, (buckets, total, count) in sorted(histograms.items(), key=lambda item: -item[1][1]):
+            p95 = self._percentile(buckets, count, 95) * 1000
+            lines.append(f"{stage:<16}{count:>9}{total:>10.2f}{total / count * 1000:>10.2f}{p95:>11.2f}"
+                         f"{total / grand_total:>8.0%}")
+        if counters:
+            lines.append(", ".join(f"{counter}={value}" for counter, value in sorted(counters.items())))
+        return "Scan metrics:\n" + "\n".join(lines)
+
+
+# Shared by every module of the scan pipeline
+metrics = Metrics(enabled=os.environ.get("SCAN_METRICS", "1") != "0")
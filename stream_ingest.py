@@ -0,0 +1,203 @@
+# Scan a video while it is still being uploaded
+#
+# The /upload route saves the whole body to disk and only then reopens it
+# with cv2.VideoCapture, so decoding can't start until the last byte has
+# arrived. StreamingVideo reads the request body in chunks on a feeder
+# thread and pipes every chunk into ffmpeg, which decodes it to raw
+# yuv4mpeg frames on stdout; frames() yields them as soon as ffmpeg has
+# them. The chunks are also spooled to disk, once, so the upload is still
+# kept and can be rescanned.
+#
+# ffmpeg can only decode from a pipe when the container is streamable (MPEG-TS,
+# WebM/MKV, MP4 with the moov atom at the front). If ffmpeg is not installed,
+# or produces no frames for this upload, frames() waits for the body to finish
+# and falls back to read_frames() on the spooled file. If ffmpeg fails part
+# way through (an unusable header, a truncated frame, a non-zero exit status),
+# the frames it already produced stand and the spooled file is read from the
+# next frame on; when that file can't be opened either, frames() raises
+# RuntimeError rather than end the scan early as if the video were complete.
+
+import shutil
+import subprocess
+import threading
+
+import cv2
+import numpy as np
+
+from frame_reader import read_frames
+
+CHUNK_SIZE = 1 << 20  # Bytes read from the request body at a time
+
+FFMPEG_ARGS = ["-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+               "-vsync", "passthrough",  # One output frame per decoded frame, like cv2.VideoCapture
+               "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2",  # yuv420p needs even dimensions
+               "-f", "yuv4mpegpipe", "-pix_fmt", "yuv420p", "pipe:1"]
+
+
+class StreamingVideo:
+
+    # stream: file-like object with read(size), e.g. Flask's request.stream
+    # spool_path: where the upload is saved as it arrives
+    # ffmpeg: path to the ffmpeg binary (None = look it up on PATH; "" = never stream, always spool first)
+    def __init__(self, stream, spool_path, chunk_size=CHUNK_SIZE, ffmpeg=None):
+        self.stream = stream
+        self.spool_path = spool_path
+        self.chunk_size = chunk_size
+        self.ffmpeg = shutil.which("ffmpeg") if ffmpeg is None else ffmpeg
+
+        self.process = None
+        self.feeder = None
+        self.stopping = threading.Event()
+        self.bytes_received = 0
+        self.frames_read = 0
+        self.streamed = False  # True once a frame came out of ffmpeg before the upload was complete
+        self.body_complete = threading.Event()
+
+    def _start(self):
+        if self.ffmpeg:
+            try:
+                self.process = subprocess.Popen([self.ffmpeg] + FFMPEG_ARGS, stdin=subprocess.PIPE,
+                                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            except OSError as error:
+                print(f"Could not start ffmpeg, scanning the upload after it is saved: {error}")
+                self.process = None
+        self.feeder = threading.Thread(target=self._feed, name="upload-feeder", daemon=True)
+        self.feeder.start()
+
+    # Feeder thread: copy the body to the spool file and to ffmpeg's stdin
+    def _feed(self):
+        decoder_input = self.process.stdin if self.process is not None else None
+        try:
+            with open(self.spool_path, "wb") as spool:
+                while not self.stopping.is_set():
+                    chunk = self.stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    spool.write(chunk)
+                    self.bytes_received += len(chunk)
+                    if decoder_input is not None:
+                        try:
+                            decoder_input.write(chunk)
+                        except (BrokenPipeError, ValueError):
+                            decoder_input = None  # ffmpeg gave up on this input; keep spooling for the fallback
+        finally:
+            self.body_complete.set()
+            if decoder_input is not None:
+                try:
+                    decoder_input.close()
+                except BrokenPipeError:
+                    pass
+
+    # (width, height, fps) from a yuv4mpeg stream header, or None if it isn't one we can read
+    # (frames() asks ffmpeg for yuv420p, so any other colour space means something went wrong)
+    @staticmethod
+    def _parse_header(line):
+        header = line.split()
+        if not header or header[0] != b"YUV4MPEG2":
+            return None
+
+        width = height = None
+        fps = 30.0
+        try:
+            for token in header[1:]:
+                if token.startswith(b"W"):
+                    width = int(token[1:])
+                elif token.startswith(b"H"):
+                    height = int(token[1:])
+                elif token.startswith(b"F"):
+                    numerator, denominator = token[1:].split(b":")
+                    if int(numerator) and int(denominator):
+                        fps = int(numerator) / int(denominator)
+                elif token.startswith(b"C") and not token.startswith(b"C420"):
+                    return None
+        except ValueError:
+            return None
+        if not width or not height or width < 0 or height < 0 or width % 2 or height % 2:
+            return None
+        return width, height, fps
+
+    # Yield (frame_idx, timestamp_ms, frame) from ffmpeg's yuv4mpeg output
+    # On anything unexpected ffmpeg is killed, so frames() sees a failed exit status
+    def _decoded_frames(self):
+        output = self.process.stdout
+        line = output.readline()
+        parsed = self._parse_header(line)
+        if parsed is None:
+            if line:
+                print(f"ffmpeg sent an unusable yuv4mpeg header: {line[:80]!r}")
+                self.process.kill()
+            return
+        width, height, fps = parsed
+        frame_bytes = width * height * 3 // 2
+
+        frame_idx = 0
+        while True:
+            line = output.readline()
+            if not line:
+                return  # End of the stream
+            if not line.startswith(b"FRAME"):
+                print(f"ffmpeg sent an unexpected yuv4mpeg frame header: {line[:80]!r}")
+                self.process.kill()
+                return
+            data = output.read(frame_bytes)
+            if len(data) < frame_bytes:
+                self.process.kill()  # Truncated frame: ffmpeg died mid-write
+                return
+            if not self.body_complete.is_set():
+                self.streamed = True
+            yuv = np.frombuffer(data, dtype=np.uint8).reshape(height * 3 // 2, width)
+            yield frame_idx, frame_idx * 1000.0 / fps, cv2.cvtColor(yuv, cv2.COLOR_YUV2BGR_I420)
+            frame_idx += 1
+
+    # Yield (frame_idx, timestamp_ms, frame) tuples, starting while the upload is still arriving
+    def frames(self):
+        self._start()
+        if self.process is not None:
+            for item in self._decoded_frames():
+                self.frames_read += 1
+                yield item
+            returncode = self.process.wait()
+            if returncode == 0 and self.frames_read:
+                return
+            if self.frames_read:
+                print(f"ffmpeg failed (exit status {returncode}) after {self.frames_read} frames, "
+                      f"scanning the rest of the upload after it is saved")
+            else:
+                print("ffmpeg could not decode the upload as a stream, scanning it after it is saved")
+
+        self.feeder.join()
+        streamed_frames = self.frames_read  # Already scanned: continue after them
+        cap = cv2.VideoCapture(self.spool_path)
+        if not cap.isOpened():
+            if streamed_frames:
+                raise RuntimeError(f"ffmpeg failed after {streamed_frames} frames and the saved upload "
+                                   f"can't be opened to scan the rest")
+            print("Error: Could not open video file.")
+            return
+        try:
+            for item in read_frames(cap, start=streamed_frames):
+                self.frames_read += 1
+                yield item
+        finally:
+            cap.release()
+
+    # Stop ffmpeg and the feeder (also called when the client goes away mid-scan)
+    def close(self):
+        self.stopping.set()
+        if self.process is not None and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        if self.process is not None:
+            self.process.stdout.close()
+        if self.feeder is not None:
+            self.feeder.join()
+
+    def summary(self):
+        mode = "streamed through ffmpeg" if self.streamed else "scanned after upload"
+        return f"Upload: {self.bytes_received / 1e6:.1f} MB, {self.frames_read} frames, {mode}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,44 @@
+# Failed writes must not leave the thread's persistent connection inside a transaction
+#
+#   python -m unittest discover tests
+
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+import database
+
+
+class FailedWriteTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        previous_path = database.DB_PATH
+        self.addCleanup(database.set_database_path, previous_path)
+        database.set_database_path(os.path.join(folder.name, "inventory.db"))
+        database.initialize_database()
+        database.add_product("Test", "ITEM-1", "Test product", 1.0, 5, 0)
+
+    def test_duplicate_add_then_batch_update(self):
+        database.add_product("Test", "ITEM-1", "Duplicate", 1.0, 5, 0)  # IntegrityError, reported and swallowed
+        self.assertFalse(database.connect_db().in_transaction)
+
+        changes = database.apply_quantity_changes({"ITEM-1": 2})
+        self.assertEqual(changes, {"ITEM-1": {"before": 5, "after": 7}})
+
+    def test_duplicate_add_does_not_lock_out_other_connections(self):
+        database.add_product("Test", "ITEM-1", "Duplicate", 1.0, 5, 0)
+
+        other = sqlite3.connect(database.DB_PATH, timeout=0.5)
+        self.addCleanup(other.close)
+        other.execute("UPDATE inventory SET quantity = quantity + 1 WHERE productID = 'ITEM-1'")
+        other.commit()
+        self.assertEqual(database.search_product("ITEM-1")[5], 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
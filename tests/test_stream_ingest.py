@@ -0,0 +1,94 @@
+# StreamingVideo against fake ffmpeg binaries put first on PATH
+#
+# Each fake reads the whole upload from stdin and then writes a scripted
+# yuv4mpeg stream, so the tests run without ffmpeg installed. The upload is a
+# small MJPG AVI that OpenCV can read, for the fallback to the spooled file.
+#
+#   python -m unittest discover tests
+
+import io
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+from stream_ingest import StreamingVideo
+
+WIDTH, HEIGHT, FRAMES = 64, 48, 5
+
+
+# Fake ffmpeg: read stdin to the end, write `header`, then `frames` grey yuv420p frames, exit with `status`
+FAKE_FFMPEG = """\
+#!{python}
+import sys
+sys.stdin.buffer.read()
+out = sys.stdout.buffer
+out.write({header!r})
+for _ in range({frames}):
+    out.write(b"FRAME\\n" + b"\\x80" * ({width} * {height} * 3 // 2))
+out.flush()
+sys.exit({status})
+"""
+
+
+class StreamingVideoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+        self.bin_folder = os.path.join(self.folder.name, "bin")
+        os.makedirs(self.bin_folder)
+        self.spool_path = os.path.join(self.folder.name, "upload.avi")
+
+        video_path = os.path.join(self.folder.name, "video.avi")
+        writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (WIDTH, HEIGHT))
+        for i in range(FRAMES):
+            writer.write(np.full((HEIGHT, WIDTH, 3), i * 40, dtype=np.uint8))
+        writer.release()
+        with open(video_path, "rb") as file:
+            self.video = file.read()
+
+    def fake_ffmpeg(self, header, frames=0, status=0):
+        path = os.path.join(self.bin_folder, "ffmpeg")
+        with open(path, "w") as file:
+            file.write(FAKE_FFMPEG.format(python=sys.executable, header=header, frames=frames, width=WIDTH,
+                                          height=HEIGHT, status=status))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+        path_variable = os.environ.get("PATH", "")
+        os.environ["PATH"] = self.bin_folder + os.pathsep + path_variable
+        self.addCleanup(os.environ.__setitem__, "PATH", path_variable)
+
+    def scan(self, body):
+        with StreamingVideo(io.BytesIO(body), self.spool_path) as video:
+            return [frame_idx for frame_idx, _, _ in video.frames()]
+
+    def test_frames_come_from_ffmpeg(self):
+        self.fake_ffmpeg(b"YUV4MPEG2 W%d H%d F10:1 Ip A1:1 C420jpeg\n" % (WIDTH, HEIGHT), frames=3)
+        self.assertEqual(self.scan(self.video), [0, 1, 2])
+
+    def test_header_without_size_falls_back_to_the_saved_upload(self):
+        self.fake_ffmpeg(b"YUV4MPEG2 F10:1 Ip A1:1 C420jpeg\n", frames=3)
+        self.assertEqual(self.scan(self.video), list(range(FRAMES)))
+
+    def test_unsupported_colour_space_falls_back_to_the_saved_upload(self):
+        self.fake_ffmpeg(b"YUV4MPEG2 W%d H%d F10:1 C444\n" % (WIDTH, HEIGHT), frames=3)
+        self.assertEqual(self.scan(self.video), list(range(FRAMES)))
+
+    def test_failure_after_some_frames_continues_from_the_saved_upload(self):
+        self.fake_ffmpeg(b"YUV4MPEG2 W%d H%d F10:1 C420jpeg\n" % (WIDTH, HEIGHT), frames=2, status=1)
+        self.assertEqual(self.scan(self.video), list(range(FRAMES)))
+
+    def test_failure_after_some_frames_raises_when_the_upload_is_unreadable(self):
+        self.fake_ffmpeg(b"YUV4MPEG2 W%d H%d F10:1 C420jpeg\n" % (WIDTH, HEIGHT), frames=2, status=1)
+        with self.assertRaises(RuntimeError):
+            self.scan(b"not a video")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# Two uploads scanned at the same time must each dedup on their own media time
+#
+# scan_frames gives every video its own ScanDeduplicator; record_scan used to
+# fall back to the app-wide wall-clock one whenever that was still empty, so
+# concurrent uploads shared (and reset) each other's duplicate state and
+# counted a code far too often or not at all.
+#
+#   python -m unittest discover tests
+
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from collections import Counter
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Shared modules live in the repo root
+
+CODE = "ITEM-DEDUP"
+FPS = 10
+SECONDS = 10  # The code is in view for the whole clip: counted at 0 s and 5 s with a 5 s dedup window
+
+app = database = None
+
+
+def setUpModule():
+    global app, database
+    folder = tempfile.TemporaryDirectory()
+    previous_folder = os.getcwd()
+    unittest.addModuleCleanup(folder.cleanup)
+    unittest.addModuleCleanup(os.chdir, previous_folder)
+    os.chdir(folder.name)  # The app creates uploads/ and detected_frames/ in the working directory
+    os.environ["INVENTORY_DB"] = os.path.join(folder.name, "inventory.db")
+
+    import database
+    database.set_database_path(os.environ["INVENTORY_DB"])
+    import integrated_code_scanner_app as app
+    database.add_product("Test", CODE, "Test product", 1.0, 0, 0)
+
+
+# (frame_idx, timestamp_ms, frame) tuples of a clip that shows one QR code the whole time
+def clip_frames(start):
+    code = cv2.QRCodeEncoder.create().encode(CODE)
+    code = cv2.resize(code, None, fx=6, fy=6, interpolation=cv2.INTER_NEAREST)
+    frame = np.full((480, 640, 3), 255, dtype=np.uint8)
+    frame[100:100 + code.shape[0], 100:100 + code.shape[1]] = code[:, :, None]
+    start.wait()  # Both uploads scan their frames at the same time
+    for frame_idx in range(FPS * SECONDS):
+        yield frame_idx, frame_idx * 1000.0 / FPS, frame.copy()
+
+
+class ConcurrentUploadDedupTest(unittest.TestCase):
+
+    def test_each_upload_counts_its_own_scans(self):
+        start = threading.Barrier(2)
+        counts = [Counter(), Counter()]
+        errors = []
+
+        def upload(counted):
+            try:
+                with database.QuantityBatch() as batch:
+                    list(app.scan_frames(clip_frames(start), batch=batch, counted=counted))
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=upload, args=(counted,)) for counted in counts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual([counted[CODE] for counted in counts], [2, 2])
+        self.assertEqual(database.search_product(CODE)[5], 4)
+        self.assertEqual(len(app.recently_scanned), 0)  # The wall-clock deduplicator is for the live camera only
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+# Tiled decoding for high-resolution frames
+#
+# One zbar call over a whole 1080p/4K frame is the most expensive step per
+# frame, and it runs on a single core. TiledDecoder splits the (grayscale,
+# blurred) frame into overlapping tiles and decodes them on a thread pool:
+# pyzbar calls zbar through ctypes, which releases the GIL, so the tiles
+# really do decode in parallel. Small labels near the edges also tend to
+# decode better in a tile than in the full frame.
+#
+# A code is only decoded if it lies entirely inside some tile, so the
+# overlap has to be at least as large as the biggest code; codes larger
+# than that are picked up by an extra pass over a downscaled copy of the
+# whole frame (overview_scale), which large codes survive. A code found in
+# several tiles is merged into one result by data and position, and every
+# result is mapped back to full-frame coordinates.
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from decoder_backends import DEFAULT_BACKEND, get_backend
+from frame_buffers import FrameBuffers
+from parallel_decode import SCAN_SYMBOLS, shift_decoded
+from scan_metrics import metrics
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Thread pool shared by every TiledDecoder in the process (one thread per core)
+def shared_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="tile-decode")
+        return _pool
+
+
+# (x0, y0, x1, y1) tiles of at most tile_size pixels, overlapping by at least overlap, covering the frame
+def tile_boxes(width, height, tile_size, overlap):
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        count = -(-(length - overlap) // (tile_size - overlap))  # ceil
+        step = (length - tile_size) / (count - 1)
+        return [int(round(i * step)) for i in range(count)]
+
+    return [(x0, y0, min(width, x0 + tile_size), min(height, y0 + tile_size))
+            for y0 in starts(height) for x0 in starts(width)]
+
+
+def _box(obj):
+    left, top, width, height = obj.rect
+    return left, top, left + width, top + height
+
+
+# One result per code: objects with the same data and type whose boxes overlap are the
+# same code seen by neighbouring tiles; the largest box (the most complete view) wins
+def merge_decoded(decoded_objects):
+    merged = []
+    for obj in sorted(decoded_objects, key=lambda obj: -obj.rect[2] * obj.rect[3]):
+        x0, y0, x1, y1 = _box(obj)
+        for kept in merged:
+            if kept.data != obj.data or kept.type != obj.type:
+                continue
+            kx0, ky0, kx1, ky1 = _box(kept)
+            if x0 <= kx1 and kx0 <= x1 and y0 <= ky1 and ky0 <= y1:
+                break
+        else:
+            merged.append(obj)
+    return merged
+
+
+class TiledDecoder:
+
+    # tile_size / overlap: tile side and minimum overlap between neighbouring tiles, in pixels
+    # overview_scale: also decode the whole frame at this scale for codes larger than the overlap (None: don't)
+    # blur: 5x5 Gaussian blur of the whole frame before tiling, as process_frame always did
+    # pool: executor the tiles run on, the process-wide shared_pool() by default
+    # buffers: FrameBuffers to preprocess into (shared with the caller's), a private one by default
+    # backend: decoder backend spec (see decoder_backends.py)
+    def __init__(self, tile_size=640, overlap=160, overview_scale=0.5, symbols=SCAN_SYMBOLS, blur=True,
+                 pool=None, buffers=None, backend=DEFAULT_BACKEND):
+        if overlap >= tile_size:
+            raise ValueError("overlap must be smaller than tile_size")
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.overview_scale = overview_scale
+        self.symbols = symbols
+        self.blur = blur
+        self.pool = pool
+        self.buffers = buffers or FrameBuffers()
+        self.decoder = get_backend(backend, symbols)
+
+        self.frames = 0
+        self.tiles = 0
+        self.merged = 0  # Results dropped as duplicates of a neighbouring tile's
+
+    def _decode_tile(self, image, x0, y0):
+        return [shift_decoded(obj, x0, y0) for obj in self.decoder(image)]
+
+    def _decode_overview(self, gray_frame):
+        image = self.buffers.scale(gray_frame, self.overview_scale, name="overview")
+        scale = gray_frame.shape[1] / image.shape[1]
+        return [shift_decoded(obj, 0, 0, scale) for obj in self.decoder(image)]
+
+    # Decode a BGR (or grayscale) frame, returning objects in frame coordinates
+    def decode(self, frame):
+        self.frames += 1
+        with metrics.time("convert"):
+            gray_frame = self.buffers.gray(frame)
+        if self.blur:
+            with metrics.time("blur"):
+                gray_frame = self.buffers.blur(gray_frame)
+
+        height, width = gray_frame.shape
+        boxes = tile_boxes(width, height, self.tile_size, self.overlap)
+        self.tiles += len(boxes)
+        if len(boxes) == 1:  # Frame fits in one tile: nothing to split
+            with metrics.time("decode"):
+                return self.decoder(gray_frame)
+
+        # Tiles are views into the preprocessing buffers; every job finishes before decode() returns
+        pool = self.pool or shared_pool()
+        with metrics.time("decode"):
+            jobs = [pool.submit(self._decode_tile, gray_frame[y0:y1, x0:x1], x0, y0) for x0, y0, x1, y1 in boxes]
+            if self.overview_scale:
+                jobs.append(pool.submit(self._decode_overview, gray_frame))
+            decoded_objects = [obj for job in jobs for obj in job.result()]
+
+        merged = merge_decoded(decoded_objects)
+        self.merged += len(decoded_objects) - len(merged)
+        return merged
+
+    def summary(self):
+        tiles_per_frame = self.tiles / self.frames if self.frames else 0.0
+        return (f"Tiled decode: {self.frames} frames, {tiles_per_frame:.1f} tiles per frame "
+                f"({self.tile_size}px, {self.overlap}px overlap), {self.merged} duplicate results merged")
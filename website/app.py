@@ -1,9 +1,12 @@
 # Main application script
 
 from flask import *
-from werkzeug.utils import secure_filename
 import os
-from barcode_scanner import process_video
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # Scanner modules live in the repo root
+from integrated_code_scanner_app import (scan_jobs, submit_scan_job, job_status_response, job_result_response,
+                                         metrics_response)
 
 app = Flask(__name__)
 UPLOAD_FOLDER = "uploads"
@@ -22,6 +25,7 @@ def home():
     return render_template('home.html')  # Render the HTML form'''
 
 # === FLASK ROUTE FOR WEB UPLOAD ===
+# Saves the video and queues it for scanning; the response carries the job ID to poll
 @app.route("/upload", methods=["POST"])
 def upload_video():
     if "video" not in request.files:
@@ -31,15 +35,22 @@ def upload_video():
     if file.filename == "":
         return jsonify({"error": "No selected file"}), 400
     
-    # Save the file to the upload folder
-    filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(file_path)
+    # Save the file to the upload folder and queue the scan (HTTP 429 when the queue is full)
+    return submit_scan_job(scan_jobs, file, app.config["UPLOAD_FOLDER"])
 
-    #process the video
-    barcodes = process_video(file_path)
-    
-    return jsonify({"barcodes":barcodes}), 200
+# === JOB STATUS / RESULT ===
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    return job_status_response(scan_jobs, job_id)
+
+@app.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    return job_result_response(scan_jobs, job_id)
+
+# === SCAN METRICS (Prometheus text format) ===
+@app.route("/metrics", methods=["GET"])
+def scan_metrics():
+    return metrics_response()
 
 @app.route('/')
 def index():